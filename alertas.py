@@ -0,0 +1,150 @@
+import datetime
+import sys
+import time
+
+import datos
+import esquema
+from analitica import COLUMNAS_KILOS
+from reglas import AMARILLO, ROJO
+
+# =====================================================================
+# 🚨 ALERTAS DE TENDENCIA (ESCANEO EN LOTE DE TODA LA COHORTE)
+# =====================================================================
+# Las alertas de tab_hoy miran un paciente y un día. Aquí se evalúan reglas de
+# ventana móvil sobre todos los pacientes a la vez: los últimos VENTANA_DIAS de
+# registros se indexan por (id_paciente, fecha), se completa la grilla con los
+# días sin reporte y cada regla es una operación de numpy sobre la matriz
+# pacientes x días. El resultado es un feed ordenado por severidad para el Radar.
+# Uso:  python alertas.py [AAAA-MM-DD]
+
+VENTANA_DIAS = 14
+ALERTAS_TTL = 60  # tendencias de varios días: un minuto de retraso es aceptable
+COLUMNAS = ["id_paciente", "fecha", "semaforo", "fatiga_bfi", *COLUMNAS_KILOS]
+COLUMNAS_FEED = ["id_paciente", "grupo", "alerta", "severidad", "detalle", "prioridad", "valor"]
+
+# Umbrales
+RACHA_SEMAFORO = 3        # reportes 🟡/🔴 seguidos (los días sin reporte no cortan la racha)
+VIGENCIA_RACHA = 3        # ... y el último, de hace menos de estos días: una racha vieja sin reportes después no alerta
+PENDIENTE_FATIGA = 0.5    # puntos BFI por día, recta sobre los últimos 7 días
+MIN_PUNTOS_PENDIENTE = 4
+RACHA_SIN_TRIAGE = 2      # días seguidos sin triage hasta ayer
+AUMENTO_CARGA = 0.30      # tonelaje de los últimos 7 días vs los 7 anteriores
+ALTA, MEDIA = "🔴 Alta", "🟡 Media"
+
+class VentanaIncompleta(Exception):
+    pass
+
+def leer_ventana(cliente, hoy, dias=VENTANA_DIAS):
+    # Registros de la ventana desde v_registros_export (índice (fecha, id)). Se comparte
+    # por TTL y no por invalidación: una escritura no cambia una tendencia de 14 días.
+    desde = str(datetime.date.fromisoformat(hoy) - datetime.timedelta(days=dias - 1))
+    def cargar():
+        # Con una ventana recortada las reglas verían días sin reporte donde no los hay:
+        # se cuenta antes de leer (lo que llegue después sólo puede sumar) y se exige todo
+        esperadas = datos._ejecutar(cliente.table("v_registros_export").select("id", count="exact").gte("fecha", desde).limit(1),
+                                    "v_registros_export", "count", {"fecha": desde}).count
+        filas = [f for pagina in datos.iterar_keyset(cliente, "v_registros_export", ", ".join(COLUMNAS + ["id"]), ("fecha", "id"), datos.MAX_FILAS_SERVIDOR,
+                                                     desde={"fecha": desde}) for f in pagina]
+        if esperadas is not None and len(filas) < esperadas: raise VentanaIncompleta(f"se leyeron {len(filas)} de {esperadas} registros desde {desde}")
+        return filas
+    return datos.cache.obtener(("v_registros_export", "alertas", (), hoy), cargar, ttl=ALERTAS_TTL)
+
+def _racha_final(x):
+    # Largo de la racha de True que termina en la última columna, por fila
+    import numpy as np
+    n = x.shape[1]
+    return n - 1 - np.where(~x, np.arange(n), -1).max(axis=1)
+
+def _alertas(mascara, pacientes, alerta, severidad_alta, valor, detalle):
+    import numpy as np
+    import pandas as pd
+    idx = np.flatnonzero(mascara)
+    alta = severidad_alta[idx]
+    return pd.DataFrame({"id_paciente": pacientes.index[idx], "grupo": pacientes["grupo"].to_numpy()[idx], "alerta": alerta,
+                         "severidad": np.where(alta, ALTA, MEDIA), "detalle": [detalle(i) for i in idx],
+                         "prioridad": np.where(alta, 2, 1), "valor": valor[idx]}).sort_values("valor", ascending=False)
+
+_memo = {}
+ultimo_escaneo_ms = None
+
+def escanear(registros, pacientes, hoy):
+    # registros: filas de leer_ventana; pacientes: filas del radar (id_paciente, grupo,
+    # fecha_inicio) para contar también a quien no reportó ningún día de la ventana
+    global ultimo_escaneo_ms
+    pacientes = list(pacientes)
+    clave = (id(registros), hash(tuple((p["id_paciente"], p.get("grupo"), p.get("fecha_inicio")) for p in pacientes)), hoy)
+    previo = _memo.get(clave)
+    if previo is not None and previo[0] is registros: return previo[1]
+    import numpy as np
+    import pandas as pd
+    inicio_ms = time.perf_counter()
+    dias = pd.date_range(end=pd.Timestamp(hoy), periods=VENTANA_DIAS)
+    pac = pd.DataFrame(pacientes, columns=["id_paciente", "grupo", "fecha_inicio"]).drop_duplicates("id_paciente").set_index("id_paciente").sort_index()
+    pac["grupo"] = pac["grupo"].fillna("EXPERIMENTAL")
+    reg = esquema.tipar(pd.DataFrame(registros, columns=COLUMNAS))
+    reg = reg[reg["id_paciente"].isin(pac.index)]
+    marco = pd.DataFrame({
+        "reportado": True,
+        "malo": reg["semaforo"].isin([ROJO, AMARILLO]).to_numpy(), "rojo": reg["semaforo"].eq(ROJO).to_numpy(),
+        "fatiga": reg["fatiga_bfi"].to_numpy(dtype="float64", na_value=np.nan),
+        "tonelaje": reg[COLUMNAS_KILOS].fillna(0).sum(axis=1).to_numpy(dtype="float64"),
+    }, index=pd.MultiIndex.from_arrays([reg["id_paciente"].to_numpy(dtype=object), reg["fecha"]], names=["id_paciente", "fecha"]))
+    marco = marco[~marco.index.duplicated(keep="last")]
+    # Grilla completa pacientes x días: reindex + reshape, sin bucles por paciente
+    marco = marco.reindex(pd.MultiIndex.from_product([pac.index, dias], names=["id_paciente", "fecha"]))
+    forma = (len(pac), len(dias))
+    matriz = lambda col, relleno: marco[col].fillna(relleno).to_numpy(dtype=type(relleno)).reshape(forma)
+    reportado, malo, rojo = matriz("reportado", False), matriz("malo", False), matriz("rojo", False)
+    fatiga, tonelaje = marco["fatiga"].to_numpy(dtype="float64").reshape(forma), matriz("tonelaje", 0.0)
+    esperado = dias.to_numpy()[None, :] >= pd.to_datetime(pac["fecha_inicio"]).to_numpy()[:, None]
+    partes = []
+
+    # 1) Racha de semáforos amarillos/rojos
+    racha = _racha_final(malo | ~reportado)
+    en_racha = np.arange(forma[1])[None, :] >= (forma[1] - racha)[:, None]
+    n_malos, n_rojos = (malo & en_racha).sum(axis=1), (rojo & en_racha).sum(axis=1)
+    vigente = _racha_final(~malo) < VIGENCIA_RACHA  # días desde el último 🟡/🔴
+    partes.append(_alertas((n_malos >= RACHA_SEMAFORO) & vigente, pac, "Racha de semáforos", n_rojos >= 2, n_malos,
+                           lambda i: f"{n_malos[i]} reportes 🟡/🔴 seguidos ({n_rojos[i]} rojos)"))
+
+    # 2) Pendiente de fatiga en 7 días: cov(t, y) / var(t) sobre los días con dato
+    y = fatiga[:, -7:]
+    con_dato = ~np.isnan(y)
+    n = con_dato.sum(axis=1)
+    t = np.broadcast_to(np.arange(7.0), y.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t_med = np.where(con_dato, t, 0).sum(axis=1) / n
+        y_med = np.where(con_dato, y, 0).sum(axis=1) / n
+        dt = np.where(con_dato, t - t_med[:, None], 0)
+        pendiente = (dt * np.where(con_dato, y - y_med[:, None], 0)).sum(axis=1) / (dt ** 2).sum(axis=1)
+    pendiente = np.where(n >= MIN_PUNTOS_PENDIENTE, pendiente, np.nan)
+    with np.errstate(invalid="ignore"):
+        partes.append(_alertas(pendiente >= PENDIENTE_FATIGA, pac, "Fatiga en ascenso", pendiente >= 2 * PENDIENTE_FATIGA, pendiente,
+                               lambda i: f"+{pendiente[i]:.1f} pts/día en 7 días ({n[i]} reportes)"))
+
+    # 3) Días seguidos sin triage (hasta ayer: el de hoy todavía puede llegar)
+    sin_triage = _racha_final((esperado & ~reportado)[:, :-1])
+    partes.append(_alertas(sin_triage >= RACHA_SIN_TRIAGE, pac, "Sin triage", sin_triage >= 2 * RACHA_SIN_TRIAGE, sin_triage,
+                           lambda i: f"{sin_triage[i]} días seguidos sin reporte"))
+
+    # 4) Salto de carga semanal
+    semana, previa = tonelaje[:, -7:].sum(axis=1), tonelaje[:, -14:-7].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        aumento = np.where(previa > 0, semana / previa - 1, np.nan)
+        partes.append(_alertas(aumento >= AUMENTO_CARGA, pac, "Salto de carga", aumento >= 2 * AUMENTO_CARGA, aumento,
+                               lambda i: f"{semana[i]:.0f} kg vs {previa[i]:.0f} kg la semana previa (+{aumento[i]:.0%})"))
+
+    # Alta antes que media; dentro de cada severidad, en el orden de las reglas y por magnitud
+    feed = pd.concat(partes, ignore_index=True).sort_values("prioridad", ascending=False, kind="stable").reset_index(drop=True)[COLUMNAS_FEED]
+    ultimo_escaneo_ms = (time.perf_counter() - inicio_ms) * 1000
+    _memo.clear()
+    _memo[clave] = (registros, feed)
+    return feed
+
+if __name__ == "__main__":
+    hoy = sys.argv[1] if len(sys.argv) > 1 else str(datetime.date.today())
+    cliente = datos.cliente_desde_secretos()
+    datos.radar.refrescar(cliente, hoy)
+    feed = escanear(leer_ventana(cliente, hoy), datos.radar.todas(), hoy)
+    print(feed.drop(columns=["prioridad", "valor"]).to_string(index=False) if len(feed) else "Sin alertas.")
+    print(f"{len(feed)} alertas · {len(datos.radar.todas())} pacientes · escaneo {ultimo_escaneo_ms:.0f} ms")
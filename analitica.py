@@ -0,0 +1,187 @@
+import datetime
+import json
+import sys
+from zoneinfo import ZoneInfo
+
+import datos
+import esquema
+
+# =====================================================================
+# 📊 ANALÍTICA LONGITUDINAL (AGREGADOS SEMANALES PRECALCULADOS)
+# =====================================================================
+# Un solo pase vectorizado sobre registros_diarios produce una fila por paciente y
+# semana de ensayo (derivada de fecha_inicio), también para las semanas sin ningún
+# reporte. Esas filas se guardan en la tabla resumen_semanal
+# (sql/006_resumen_semanal.sql): cada corrida recalcula el histórico completo de los
+# pacientes con cambios desde la anterior y las últimas SEMANAS_RECIENTES de todos
+# (el paso del tiempo también cambia la semana en curso); los paneles leen el
+# resumen en vez del histórico crudo. La marca de una corrida es su hora de inicio
+# menos MARGEN_MARCA y se registra en resumen_corridas recién cuando terminaron todos
+# los lotes: una corrida que se cae a mitad de camino se repite entera la próxima vez.
+# Uso (cron, al menos una vez por semana):  python analitica.py
+
+MAP_ANIMO = {v: i + 1 for i, v in enumerate(esquema.ANIMOS)}
+MAP_SUENO = {v: i + 1 for i, v in enumerate(esquema.CALIDADES_SUENO)}
+DIAS_SESION = (0, 2, 4)  # L-M-V
+SEMANAS_RECIENTES = 3
+MARGEN_MARCA = datetime.timedelta(minutes=5)  # transacciones que confirman con un now() anterior
+ZONA = ZoneInfo("America/Montevideo")
+COLUMNAS_KILOS = [f"kilos_ejercicio_{k}" for k in range(1, 5)]
+COLUMNAS_FUENTE = ["id_paciente", "fecha", "fecha_inicio", "cohorte", "grupo", "fatiga_bfi", "dolor_maximo", "eficiencia_sueno",
+                   "estado_sesion", "rpe_sesion", *COLUMNAS_KILOS, "actualizado"]
+COLUMNAS_PACIENTE = ["id_paciente", "cohorte", "grupo", "fecha_inicio", "updated_at"]
+COLUMNAS_RESUMEN = "id_paciente, semana, cohorte, grupo, fatiga_media, dolor_medio, eficiencia_media, dias_reportados, sesiones, adherencia_triage, adherencia_sesiones, tonelaje, rpe_medio"
+
+# --- Histórico de un paciente para los gráficos ---
+_preparados = {}
+
+def preparar_historial(filas):
+    # Las filas vienen de la caché de datos.py: mientras no se invalide es el mismo
+    # objeto lista, así que el DataFrame preparado se reutiliza entre reruns.
+    previo = _preparados.get(id(filas))
+    if previo is not None and previo[0] is filas: return previo[1]
+    import pandas as pd
+    df = esquema.tipar(pd.DataFrame(filas))
+    df["fecha"] = df["fecha"].dt.strftime('%d-%m')
+    df.set_index("fecha", inplace=True)
+    # Puntajes = posición en la escala ordenada de la categórica (MAP_ANIMO / MAP_SUENO)
+    if "estado_animo" in df.columns: df["Puntaje Ánimo (1-6)"] = esquema.puntaje(df["estado_animo"])
+    if "calidad_sueno" in df.columns: df["Puntaje Sueño (1-4)"] = esquema.puntaje(df["calidad_sueno"])
+    numericas = df.select_dtypes("number").columns
+    df[numericas] = df[numericas].fillna(0)
+    if len(_preparados) > 256: _preparados.clear()
+    _preparados[id(filas)] = (filas, df)
+    return df
+
+# --- Agregados vectorizados ---
+def _grilla_semanas(pacientes, hoy):
+    # Una fila por paciente y semana de ensayo, de la 1 a la que contiene `hoy`, con los
+    # días transcurridos y las sesiones L-M-V que ya debieron ocurrir en cada una
+    import numpy as np
+    import pandas as pd
+    pac = pacientes[pacientes["fecha_inicio"].notna() & (pacientes["fecha_inicio"] <= hoy)]
+    n = ((hoy - pac["fecha_inicio"]).dt.days // 7 + 1).to_numpy()
+    total = int(n.sum())
+    semana = np.arange(total) - np.repeat(np.cumsum(n) - n, n) + 1
+    inicio = pd.Series(np.repeat(pac["fecha_inicio"].to_numpy(), n)) + pd.to_timedelta((semana - 1) * 7, unit="D")
+    dias = np.minimum((hoy - inicio).dt.days.to_numpy() + 1, 7)
+    dia_semana = inicio.dt.weekday.to_numpy()
+    esperadas = sum(np.isin((dia_semana + k) % 7, DIAS_SESION) & (k < dias) for k in range(7))
+    return pd.DataFrame({"id_paciente": np.repeat(pac["id_paciente"].to_numpy(), n), "semana": semana.astype("int64"), "inicio_semana": inicio,
+                         "cohorte": np.repeat(pac["cohorte"].to_numpy(), n), "grupo": np.repeat(pac["grupo"].fillna("EXPERIMENTAL").to_numpy(), n),
+                         "dias_transcurridos": dias, "sesiones_esperadas": np.asarray(esperadas, dtype="int64")})
+
+def agregados_semanales(df, pacientes, hoy, desde=None):
+    # df: registros_diarios; pacientes: filas con id_paciente, cohorte, grupo, fecha_inicio.
+    # Una fila por (id_paciente, semana) de la grilla completa: una semana sin reportes
+    # cuenta con adherencia 0 y la semana en curso se divide por los días transcurridos.
+    # Con `desde`, sólo las semanas que empiezan ese día o después (df debe cubrirlas).
+    import pandas as pd
+    hoy = pd.Timestamp(hoy)
+    pac = pd.DataFrame(list(pacientes), columns=COLUMNAS_PACIENTE).drop_duplicates("id_paciente")
+    pac["fecha_inicio"] = pd.to_datetime(pac["fecha_inicio"], errors="coerce", format="ISO8601")
+    grilla = _grilla_semanas(pac, hoy)
+    if desde is not None: grilla = grilla[grilla["inicio_semana"] >= pd.Timestamp(desde)]
+    num = lambda col: pd.to_numeric(df[col], errors="coerce") if col in df.columns else pd.Series(float("nan"), index=df.index)
+    inicio = df["id_paciente"].map(pac.set_index("id_paciente")["fecha_inicio"]).astype("datetime64[ns]")
+    semana = (pd.to_datetime(df["fecha"], format="ISO8601") - inicio).dt.days // 7 + 1
+    sesion = df["estado_sesion"].eq("Completado") if "estado_sesion" in df.columns else pd.Series(False, index=df.index)
+    base = pd.DataFrame({
+        "id_paciente": df["id_paciente"], "semana": semana,
+        "fatiga": num("fatiga_bfi"), "dolor": num("dolor_maximo"), "eficiencia": num("eficiencia_sueno"), "sesion": sesion,
+        "rpe": num("rpe_sesion").where(sesion), "tonelaje": sum(num(c).fillna(0) for c in COLUMNAS_KILOS),
+    }).dropna(subset=["semana"])
+    agg = base.groupby(["id_paciente", "semana"], sort=True).agg(
+        fatiga_media=("fatiga", "mean"), dolor_medio=("dolor", "mean"), eficiencia_media=("eficiencia", "mean"),
+        dias_reportados=("fatiga", "size"), sesiones=("sesion", "sum"), tonelaje=("tonelaje", "sum"), rpe_medio=("rpe", "mean"),
+    ).reset_index()
+    agg["semana"] = agg["semana"].astype("int64")
+    # Los registros fuera de la grilla (antes de fecha_inicio o con fecha futura) no cuentan
+    res = grilla.merge(agg, on=["id_paciente", "semana"], how="left").sort_values(["id_paciente", "semana"], ignore_index=True)
+    for col in ("dias_reportados", "sesiones"): res[col] = res[col].fillna(0).astype("int64")
+    res["tonelaje"] = res["tonelaje"].fillna(0.0)
+    res["adherencia_triage"] = (res["dias_reportados"] / res["dias_transcurridos"]).clip(upper=1.0)
+    res["adherencia_sesiones"] = (res["sesiones"] / res["sesiones_esperadas"].where(res["sesiones_esperadas"] > 0)).clip(upper=1.0).where(res["grupo"] != "CONTROL")
+    return res.drop(columns=["inicio_semana", "dias_transcurridos", "sesiones_esperadas"])
+
+def agregados_por_brazo(resumen):
+    # Cohorte (MAMA/PROSTATA) x brazo (EXPERIMENTAL/CONTROL) x semana de ensayo
+    return resumen.groupby(["cohorte", "grupo", "semana"], sort=True).agg(
+        pacientes=("id_paciente", "nunique"), fatiga_media=("fatiga_media", "mean"), dolor_medio=("dolor_medio", "mean"),
+        eficiencia_media=("eficiencia_media", "mean"), adherencia_triage=("adherencia_triage", "mean"),
+        adherencia_sesiones=("adherencia_sesiones", "mean"), tonelaje_medio=("tonelaje", "mean"), rpe_medio=("rpe_medio", "mean"),
+    ).reset_index()
+
+# --- Persistencia incremental en resumen_semanal ---
+def _marca_resumen(cliente):
+    res = datos._ejecutar(cliente.table("resumen_corridas").select("marca").order("marca", desc=True).limit(1), "resumen_corridas", "select")
+    return res.data[0]["marca"] if res.data else None
+
+def _registrar_corrida(cliente, marca, completa, pacientes, filas):
+    fila = {"marca": marca, "completa": completa, "pacientes": pacientes, "filas": filas, "terminado_el": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+    datos._ejecutar(cliente.table("resumen_corridas").insert(fila), "resumen_corridas", "insert")
+
+def _hoy():
+    return datetime.datetime.now(ZONA).date()
+
+def _guardar_semanas(cliente, res, marca):
+    res["marca_fuente"] = marca
+    res["calculado_el"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    datos.guardar_lote(cliente, "resumen_semanal", json.loads(res.to_json(orient="records")), "id_paciente,semana")
+
+def actualizar_resumen(cliente, completo=False, lote_pacientes=200, hoy=None):
+    # Devuelve (pacientes recalculados, filas semanales escritas)
+    import pandas as pd
+    hoy = hoy or _hoy()
+    nueva_marca = (datetime.datetime.now(datetime.timezone.utc) - MARGEN_MARCA).isoformat()
+    columnas_fuente = ", ".join(COLUMNAS_FUENTE + ["id"])
+    pacientes = [f for pagina in datos.iterar_keyset(cliente, "pacientes", ", ".join(COLUMNAS_PACIENTE), ("id_paciente",)) for f in pagina]
+    marca = None if completo else _marca_resumen(cliente)
+    if marca is None: cambiados = sorted(p["id_paciente"] for p in pacientes)
+    else:
+        # Registros nuevos o modificados y pacientes editados (p.ej. fecha_inicio) desde la marca
+        cambiados = {f["id_paciente"] for pagina in datos.iterar_keyset(cliente, "v_registros_export", "id_paciente, fecha, id", ("fecha", "id"), datos.MAX_FILAS_SERVIDOR,
+                                                                        desde={"actualizado": marca}) for f in pagina}
+        cambiados |= {p["id_paciente"] for p in pacientes if p.get("updated_at") and pd.Timestamp(p["updated_at"]) >= pd.Timestamp(marca)}
+        cambiados = sorted(cambiados)
+    por_id = {p["id_paciente"]: p for p in pacientes}
+    recalculados = escritas = 0
+    for i in range(0, len(cambiados), lote_pacientes):
+        # Se recalcula el histórico completo de cada paciente afectado: un cambio de
+        # fecha_inicio desplaza todas sus semanas.
+        grupo = cambiados[i:i + lote_pacientes]
+        filas = [f for pagina in datos.iterar_keyset(cliente, "v_registros_export", columnas_fuente, ("fecha", "id"), datos.MAX_FILAS_SERVIDOR,
+                                                     en={"id_paciente": grupo}) for f in pagina]
+        df, roster = pd.DataFrame(filas, columns=COLUMNAS_FUENTE), [por_id[p] for p in grupo if p in por_id]
+        res = agregados_semanales(df, roster, hoy)
+        if len(res): _guardar_semanas(cliente, res, nueva_marca)
+        # Semanas que ya no existen (fecha_inicio posterior o anulada): se borran las que
+        # superan la última semana recalculada de cada paciente
+        ultima = res.groupby("id_paciente")["semana"].max().reindex(grupo, fill_value=0)
+        for semana, ids in ultima.groupby(ultima).groups.items():
+            datos.borrar(cliente, "resumen_semanal", {"id_paciente": list(ids)}, {"semana": int(semana)})
+        recalculados += len(grupo); escritas += len(res)
+    ya = set(cambiados)
+    resto = [p for p in pacientes if p["id_paciente"] not in ya]
+    if marca is not None and resto:
+        # Semanas recientes del resto: una semana en curso cambia con cada día que pasa
+        # aunque el paciente no reporte
+        desde = hoy - datetime.timedelta(days=7 * SEMANAS_RECIENTES - 1)
+        filas = [f for pagina in datos.iterar_keyset(cliente, "v_registros_export", columnas_fuente, ("fecha", "id"), datos.MAX_FILAS_SERVIDOR,
+                                                     desde={"fecha": str(desde)}) for f in pagina]
+        res = agregados_semanales(pd.DataFrame(filas, columns=COLUMNAS_FUENTE), resto, hoy, desde=desde)
+        if len(res): _guardar_semanas(cliente, res, nueva_marca)
+        escritas += len(res)
+    _registrar_corrida(cliente, nueva_marca, marca is None, recalculados, escritas)
+    return recalculados, escritas
+
+def leer_resumen(cliente):
+    # Recorrido por clave: una sola consulta quedaría cortada en el tope de filas del servidor
+    def cargar():
+        return [f for pagina in datos.iterar_keyset(cliente, "resumen_semanal", COLUMNAS_RESUMEN, ("id_paciente", "semana"), datos.MAX_FILAS_SERVIDOR) for f in pagina]
+    return datos.cache.obtener(("resumen_semanal", COLUMNAS_RESUMEN, (), "keyset"), cargar)
+
+if __name__ == "__main__":
+    completo = "--completo" in sys.argv
+    recalculados, escritas = actualizar_resumen(datos.cliente_desde_secretos(), completo)
+    print(f"{recalculados} pacientes recalculados, {escritas} filas semanales escritas.")
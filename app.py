@@ -1,13 +1,21 @@
 import streamlit as st
 import datetime
+import os
+import tempfile
+import time
 import pytz
-import pandas as pd
 from supabase import create_client, Client
+import datos
+import metricas
+import reglas
+import exportar
+import analitica
+import alertas
+import esquema
 import streamlit.components.v1 as components
-import qrcode
-from io import BytesIO
 
 st.set_page_config(page_title="DTx Onco", page_icon="🧬", layout="wide")
+metricas.inicio_rerun(st.session_state.get("role"))
 
 # =====================================================================
 # ⚙️ INYECCIÓN PWA Y ZONA HORARIA
@@ -23,12 +31,39 @@ dia_semana = fecha_hoy_uy.weekday()
 nombres_dias = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
 
 # --- CONEXIÓN A LA NUBE ---
+# BACKEND = "local" en secrets usa el sustituto en memoria (pruebas de carga / desarrollo)
 @st.cache_resource
 def init_connection():
+    if st.secrets.get("BACKEND", "supabase") == "local":
+        import backend_local
+        return backend_local.compartido(latencia=float(st.secrets.get("LOCAL_LATENCIA", 0.0)), variacion=float(st.secrets.get("LOCAL_VARIACION", 0.0)),
+                                        tasa_fallos=float(st.secrets.get("LOCAL_TASA_FALLOS", 0.0)), n_pacientes=int(st.secrets.get("LOCAL_PACIENTES", 20)))
     return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
 
+# Sin cliente no se corta la app: las lecturas salen de las fotos en disco y las
+# escrituras quedan en cola (ver datos.py / cache_disco.py). Se reintenta en cada rerun.
 try: supabase: Client = init_connection()
-except Exception as e: st.error(f"Error de red: {e}"); st.stop()
+except Exception as e: supabase = datos.ClienteSinConexion(e, st.secrets.get("SUPABASE_URL"))
+datos.usar_backend(supabase)
+
+# Una vez por proceso y día: foto del radar desde disco + delta en segundo plano
+@st.cache_resource
+def calentar_cache(fecha): return datos.calentar(supabase, fecha)
+
+calentar_cache(hoy_str)
+datos.drenar_cola(supabase)
+
+def hora_local(epoch): return datetime.datetime.fromtimestamp(epoch, zona_horaria).strftime("%d/%m %H:%M:%S")
+
+# El volcado del ensayo es un archivo temporal propio de la sesión: se borra al
+# descargarlo, al preparar otro o al cerrar sesión
+def descartar_exportacion():
+    ruta_exp = st.session_state.pop("exportacion", (None,))[0]
+    if ruta_exp and os.path.exists(ruta_exp): os.remove(ruta_exp)
+
+def confirmar_escritura(resultado, mensaje):
+    if resultado is None: st.warning("📴 Sin conexión: el cambio quedó en cola y se enviará solo al volver la red.")
+    else: st.success(mensaje)
 
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -38,10 +73,7 @@ if 'logged_in' not in st.session_state:
 # =====================================================================
 # 📚 MOTOR CIENTÍFICO (RUTINAS Y REGLAS)
 # =====================================================================
-def calcular_semaforo(eficiencia, latencia, fatiga, estres, dolor_max, estado_animo):
-    if fatiga >= 8 or dolor_max >= 7 or estado_animo in ["Muy mal", "Mal"]: return "🔴 ROJO"
-    elif eficiencia < 85.0 or latencia > 45 or fatiga >= 5 or estres >= 6 or estado_animo == "Regular": return "🟡 AMARILLO"
-    else: return "🟢 VERDE"
+# Umbrales del semáforo: ver reglas.py / reglas_triage.json (versionados)
 
 def obtener_rutina(cohorte, dia_semana):
     if cohorte == "MAMA":
@@ -54,6 +86,16 @@ def obtener_rutina(cohorte, dia_semana):
         elif dia_semana == 4: return ["Sentadilla Búlgara", "Flexiones / Inclinado", "Remo en TRX / 1 Brazo", "Suelo Pélvico (Kegel)"]
     return ["Descanso", "Descanso", "Descanso", "Descanso"]
 
+# Las dependencias pesadas (qrcode/Pillow, pandas) se importan sólo en el panel del
+# investigador: el celular del paciente no paga su tiempo de arranque.
+@st.cache_data(show_spinner=False)
+def generar_qr_png(url):
+    import qrcode
+    from io import BytesIO
+    qr = qrcode.QRCode(version=1, box_size=8, border=2); qr.add_data(url); qr.make(fit=True)
+    buf = BytesIO(); qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
 def obtener_intensidad(dia_semana):
     if dia_semana == 0: return "65% (LUNES - Carga Base)"
     elif dia_semana == 2: return "75% (MIÉRCOLES - Día Pesado)"
@@ -64,6 +106,7 @@ def obtener_intensidad(dia_semana):
 # 🔐 PANTALLA DE LOGIN
 # =====================================================================
 if not st.session_state.logged_in:
+    metricas.marcar_fase("login")
     col_izq, col_login, col_der = st.columns([1, 2, 1])
     with col_login:
         st.markdown("<h2 style='text-align: center;'>🧬 DTx Onco</h2>", unsafe_allow_html=True)
@@ -73,12 +116,13 @@ if not st.session_state.logged_in:
                 user_input = st.text_input("ID de Paciente").strip().upper()
                 pin_input = st.text_input("PIN Secreto", type="password")
                 if st.form_submit_button("Ingresar 🚀", use_container_width=True, type="primary"):
-                    res = supabase.table("pacientes").select("*").eq("id_paciente", user_input).execute()
-                    if len(res.data) > 0 and str(res.data[0].get("pin")) == pin_input:
+                    try: pac = datos.buscar_paciente(supabase, user_input)
+                    except Exception as e: pac = False; st.error(f"📴 No se pudo validar el PIN (sin conexión): {e}")
+                    if pac and str(pac.get("pin")) == pin_input:
                         st.session_state.logged_in = True; st.session_state.role = "Paciente"
-                        st.session_state.user_id = res.data[0]["id_paciente"]; st.session_state.cohorte = res.data[0]["cohorte"]
-                        st.session_state.grupo = res.data[0].get("grupo") or "EXPERIMENTAL"; st.rerun()
-                    else: st.error("❌ Error en credenciales.")
+                        st.session_state.user_id = pac["id_paciente"]; st.session_state.cohorte = pac["cohorte"]
+                        st.session_state.grupo = pac.get("grupo") or "EXPERIMENTAL"; st.rerun()
+                    elif pac is not False: st.error("❌ Error en credenciales.")
         with tab_investigador:
             with st.form("login_inv"):
                 pass_input = st.text_input("Contraseña Maestra", type="password")
@@ -86,18 +130,49 @@ if not st.session_state.logged_in:
                     if pass_input == st.secrets.get("INVESTIGADOR_PASSWORD", "123456789"):
                         st.session_state.logged_in = True; st.session_state.role = "Investigador"; st.session_state.user_id = "PI"; st.rerun()
                     else: st.error("❌ Contraseña denegada.")
-    st.stop() 
+    metricas.fin_rerun(); st.stop() 
 
 st.sidebar.title("DTx Onco 🧬")
-if st.session_state.role == "Investigador": st.sidebar.success(f"✅ Panel Clínico\n📅 {nombres_dias[dia_semana]}, {hoy_str}")
+if st.session_state.role == "Investigador":
+    st.sidebar.success(f"✅ Panel Clínico\n📅 {nombres_dias[dia_semana]}, {hoy_str}")
+    stats_cache = datos.cache.estadisticas()
+    st.sidebar.caption(f"🗄️ Caché: {stats_cache['aciertos']} aciertos / {stats_cache['fallos']} fallos ({stats_cache['tasa_aciertos']:.0%}) · {stats_cache['desde_disco']} desde disco")
+    if datos.estado.sin_conexion_desde: st.sidebar.error(f"📴 Sin conexión desde {hora_local(datos.estado.sin_conexion_desde)}")
+    pendientes = datos.escrituras_pendientes()
+    if pendientes: st.sidebar.caption(f"📮 Escrituras en cola: {pendientes}")
+    st.sidebar.selectbox("🔄 Auto-actualizar radar", [0, 15, 30, 60], format_func=lambda seg: f"Cada {seg} s" if seg else "Desactivado", key="auto_radar")
+    stats_reruns = metricas.resumen_reruns()
+    st.sidebar.caption(f"⏱️ Reruns: {stats_reruns['reruns_completo']} completos / {stats_reruns['reruns_fragmento']} de fragmento · CPU por reporte (paciente): "
+                       + (f"{stats_reruns['cpu_ms_por_reporte']:.0f} ms" if stats_reruns["cpu_ms_por_reporte"] is not None else "—")
+                       + f" · CPU investigador: {stats_reruns['cpu_ms_investigador']:.0f} ms")
+    with st.sidebar.expander("📊 Métricas de backend"):
+        snap = metricas.instantanea()
+        st.dataframe([{"Llamada": t, "N": m["llamadas"], "Errores": m["errores"], "p50 ms": round(m["p50_ms"], 1), "p95 ms": round(m["p95_ms"], 1), "KB": round(m["bytes"] / 1024, 1)}
+                      for t, m in sorted(snap["backend"].items())], hide_index=True, use_container_width=True)
+        st.dataframe([{"Fase": f, "N": m["n"], "p50 ms": round(m["p50_ms"], 1), "p95 ms": round(m["p95_ms"], 1)} for f, m in sorted(snap["fases"].items())],
+                     hide_index=True, use_container_width=True)
+        st.download_button("⬇️ Prometheus", metricas.texto_prometheus(snap), file_name="metricas.prom", use_container_width=True)
+    with st.sidebar.expander("📦 Exportar datos del ensayo"):
+        formato_exp = st.radio("Formato", ["csv", "parquet"], horizontal=True)
+        if st.button("Preparar archivo", use_container_width=True):
+            descartar_exportacion()
+            fd_exp, ruta_exp = tempfile.mkstemp(prefix="dtx_registros_", suffix=f".{formato_exp}"); os.close(fd_exp)
+            try:
+                with st.spinner("Exportando en bloques..."): n_exp, _ = exportar.exportar(supabase, ruta_exp, formato_exp)
+            except Exception: os.remove(ruta_exp); raise
+            st.session_state.exportacion = (ruta_exp, n_exp, f"dtx_registros_{hoy_str}.{formato_exp}")
+        if st.session_state.get("exportacion") and os.path.exists(st.session_state.exportacion[0]):
+            ruta_exp, n_exp, nombre_exp = st.session_state.exportacion
+            with open(ruta_exp, "rb") as f_exp: st.download_button(f"⬇️ Descargar ({n_exp} filas)", f_exp, file_name=nombre_exp, on_click=descartar_exportacion, use_container_width=True)
 else: st.sidebar.info(f"👤 {st.session_state.user_id}"); st.sidebar.caption(f"📅 Fecha: {hoy_str}")
 st.sidebar.divider()
-if st.sidebar.button("Cerrar Sesión 🔒", use_container_width=True, type="primary"): st.session_state.clear(); st.rerun()
+if st.sidebar.button("Cerrar Sesión 🔒", use_container_width=True, type="primary"): descartar_exportacion(); st.session_state.clear(); st.rerun()
 
 # =====================================================================
 # 📱 UNIVERSO 1: PACIENTE (MONITOREO CONTINUO L-D)
 # =====================================================================
 if st.session_state.role == "Paciente":
+    metricas.marcar_fase("triage")
     col1, col_celular, col3 = st.columns([1, 2, 1])
     with col_celular:
         st.markdown(f"**📅 Hoy es {nombres_dias[dia_semana]}, {fecha_hoy_uy.strftime('%d/%m/%Y')}**")
@@ -111,112 +186,160 @@ if st.session_state.role == "Paciente":
             
         st.divider()
         
-        # --- BLOQUE 1: SUEÑO ---
-        st.subheader("💤 1. Arquitectura y Calidad del Sueño")
-        c1, c2 = st.columns(2)
-        with c1: hora_acostar = st.time_input("🛌 Hora acostarse", datetime.time(22, 30))
-        with c2: hora_despertar = st.time_input("🌅 Hora despertarse", datetime.time(6, 30))
+        # Las interacciones del cuestionario sólo re-ejecutan este fragmento (cálculos locales);
+        # la red se usa únicamente al enviar.
+        @st.fragment
+        @metricas.medir_fragmento("Paciente")
+        def cuestionario_triage():
+            # --- BLOQUE 1: SUEÑO ---
+            st.subheader("💤 1. Arquitectura y Calidad del Sueño")
+            c1, c2 = st.columns(2)
+            with c1: hora_acostar = st.time_input("🛌 Hora acostarse", datetime.time(22, 30))
+            with c2: hora_despertar = st.time_input("🌅 Hora despertarse", datetime.time(6, 30))
         
-        c3, c4 = st.columns(2)
-        with c3: latencia = st.number_input("⏱️ Min. hasta dormir:", 0, 180, 15, 5)
-        with c4: despertares_veces = st.number_input("🔄 N° veces que despertaste:", 0, 20, 0, 1)
+            c3, c4 = st.columns(2)
+            with c3: latencia = st.number_input("⏱️ Min. hasta dormir:", 0, 180, 15, 5)
+            with c4: despertares_veces = st.number_input("🔄 N° veces que despertaste:", 0, 20, 0, 1)
 
-        calidad_sueno = st.selectbox("⭐ ¿Cómo evalúas la calidad de tu sueño?", ["Malo", "Regular", "Bueno", "Reparador"], index=2)
+            calidad_sueno = st.selectbox("⭐ ¿Cómo evalúas la calidad de tu sueño?", ["Malo", "Regular", "Bueno", "Reparador"], index=2)
 
-        dt_acostar = datetime.datetime.combine(fecha_hoy_uy, hora_acostar)
-        dt_despertar = datetime.datetime.combine(fecha_hoy_uy, hora_despertar)
-        if dt_despertar <= dt_acostar: dt_despertar += datetime.timedelta(days=1)
-        t_cama = (dt_despertar - dt_acostar).total_seconds() / 60
+            dt_acostar = datetime.datetime.combine(fecha_hoy_uy, hora_acostar)
+            dt_despertar = datetime.datetime.combine(fecha_hoy_uy, hora_despertar)
+            if dt_despertar <= dt_acostar: dt_despertar += datetime.timedelta(days=1)
+            t_cama = (dt_despertar - dt_acostar).total_seconds() / 60
         
-        # Penalizamos 10 min de vigilia por cada despertar reportado
-        t_dormido = max(0, t_cama - latencia - (despertares_veces * 10)) 
-        eficiencia = (t_dormido / t_cama) * 100 if t_cama > 0 else 0
-        st.info(f"📊 Tiempo estimado de sueño: **{t_dormido/60:.1f} hs netas**.")
+            # Penalizamos 10 min de vigilia por cada despertar reportado
+            t_dormido = max(0, t_cama - latencia - (despertares_veces * 10)) 
+            eficiencia = (t_dormido / t_cama) * 100 if t_cama > 0 else 0
+            st.info(f"📊 Tiempo estimado de sueño: **{t_dormido/60:.1f} hs netas**.")
 
-        st.divider()
-        # --- BLOQUE 2: ÁNIMO Y LUZ SOLAR ---
-        st.subheader("🧠 2. Estado de Ánimo y Exposición Solar")
-        estado_animo = st.select_slider("¿Cómo te sientes hoy?", ["Muy mal", "Mal", "Regular", "Bien", "Muy Bien", "Excelente"], value="Bien")
+            st.divider()
+            # --- BLOQUE 2: ÁNIMO Y LUZ SOLAR ---
+            st.subheader("🧠 2. Estado de Ánimo y Exposición Solar")
+            estado_animo = st.select_slider("¿Cómo te sientes hoy?", ["Muy mal", "Mal", "Regular", "Bien", "Muy Bien", "Excelente"], value="Bien")
         
-        st.markdown("**¿Cuánto tiempo estuviste expuesto directamente al Sol ayer?**")
-        csol1, csol2 = st.columns(2)
-        with csol1: sol_horas = st.number_input("Horas:", 0, 10, 0, 1)
-        with csol2: sol_minutos = st.number_input("Minutos:", 0, 59, 15, 5)
-        tiempo_sol_total_min = (sol_horas * 60) + sol_minutos
+            st.markdown("**¿Cuánto tiempo estuviste expuesto directamente al Sol ayer?**")
+            csol1, csol2 = st.columns(2)
+            with csol1: sol_horas = st.number_input("Horas:", 0, 10, 0, 1)
+            with csol2: sol_minutos = st.number_input("Minutos:", 0, 59, 15, 5)
+            tiempo_sol_total_min = (sol_horas * 60) + sol_minutos
 
-        st.divider()
-        # --- BLOQUE 3: FATIGA Y DOLOR ---
-        st.subheader("🔋 3. Fatiga y Estrés")
-        fatiga = st.select_slider("Fatiga física (0=Energía | 10=Agotamiento)", list(range(11)), 2)
-        estres = st.select_slider("Estrés/Ansiedad (0=Paz | 10=Angustia)", list(range(11)), 2)
+            st.divider()
+            # --- BLOQUE 3: FATIGA Y DOLOR ---
+            st.subheader("🔋 3. Fatiga y Estrés")
+            fatiga = st.select_slider("Fatiga física (0=Energía | 10=Agotamiento)", list(range(11)), 2)
+            estres = st.select_slider("Estrés/Ansiedad (0=Paz | 10=Angustia)", list(range(11)), 2)
         
-        st.divider()
-        st.subheader("🦴 4. Dolor Corporal")
-        zonas_afectadas = st.multiselect("📍 Zonas afectadas:", ["Hombro Izq", "Hombro Der", "Lumbar", "Rodillas", "Neuropatía"])
-        dolor_max = 0
-        if zonas_afectadas:
-            dolor_max = max([st.slider(f"Intensidad en {z}:", 1, 10, 5) for z in zonas_afectadas])
+            st.divider()
+            st.subheader("🦴 4. Dolor Corporal")
+            zonas_afectadas = st.multiselect("📍 Zonas afectadas:", ["Hombro Izq", "Hombro Der", "Lumbar", "Rodillas", "Neuropatía"])
+            dolor_max = 0
+            if zonas_afectadas:
+                dolor_max = max([st.slider(f"Intensidad en {z}:", 1, 10, 5) for z in zonas_afectadas])
         
-        st.markdown("<br>", unsafe_allow_html=True)
+            st.markdown("<br>", unsafe_allow_html=True)
         
-        btn_txt = "Enviar Registro Diario 🚀" if st.session_state.grupo == "CONTROL" else "Enviar Reporte 🚀"
+            btn_txt = "Enviar Registro Diario 🚀" if st.session_state.grupo == "CONTROL" else "Enviar Reporte 🚀"
         
-        if st.button(btn_txt, use_container_width=True, type="primary"):
-            datos_triage = {
-                "id_paciente": st.session_state.user_id, "fecha": hoy_str, "estado_triage": "Completado", 
-                "semaforo": calcular_semaforo(eficiencia, latencia, fatiga, estres, dolor_max, estado_animo), 
-                "eficiencia_sueno": eficiencia, "latencia_min": latencia, 
-                "despertares_veces": despertares_veces, "calidad_sueno": calidad_sueno,
-                "estado_animo": estado_animo, "exposicion_sol_min": tiempo_sol_total_min,
-                "fatiga_bfi": fatiga, "estres_nccn": estres, "dolor_maximo": dolor_max, 
-                "zonas_dolor": ", ".join(zonas_afectadas) if zonas_afectadas else "Ninguna"
-            }
-            with st.spinner("Transmitiendo..."):
-                try:
-                    existe = supabase.table("registros_diarios").select("id").eq("id_paciente", st.session_state.user_id).eq("fecha", hoy_str).execute()
-                    if len(existe.data) > 0: supabase.table("registros_diarios").update(datos_triage).eq("id", existe.data[0]["id"]).execute()
-                    else: supabase.table("registros_diarios").insert(datos_triage).execute()
+            if st.button(btn_txt, use_container_width=True, type="primary"):
+                datos_triage = {
+                    "id_paciente": st.session_state.user_id, "fecha": hoy_str, "estado_triage": "Completado", 
+                    "semaforo": reglas.calcular_semaforo(eficiencia, latencia, fatiga, estres, dolor_max, estado_animo), "version_reglas": reglas.VERSION_VIGENTE, 
+                    "eficiencia_sueno": eficiencia, "latencia_min": latencia, 
+                    "despertares_veces": despertares_veces, "calidad_sueno": calidad_sueno,
+                    "estado_animo": estado_animo, "exposicion_sol_min": tiempo_sol_total_min,
+                    "fatiga_bfi": fatiga, "estres_nccn": estres, "dolor_maximo": dolor_max, 
+                    "zonas_dolor": ", ".join(zonas_afectadas) if zonas_afectadas else "Ninguna"
+                }
+                with st.spinner("Transmitiendo..."):
+                    try:
+                        guardado = datos.guardar_triage(supabase, datos_triage)
+                        metricas.registrar_reporte()
                     
-                    if st.session_state.grupo == "CONTROL": st.success("✅ ¡Registro guardado! Muchas gracias por tu compromiso.")
-                    else:
-                        if dia_semana in [0, 2, 4]: st.success("✅ ¡Reporte guardado! Te esperamos hoy para tu sesión de entrenamiento.")
-                        else: st.success("✅ ¡Reporte guardado! Excelente trabajo monitoreando tu recuperación de hoy.")
-                except Exception as e: st.error(f"Error de conexión: {e}")
+                        if guardado is None: st.warning("📴 Sin conexión: tu reporte quedó guardado y se enviará solo en cuanto vuelva la red. No hace falta repetirlo.")
+                        elif st.session_state.grupo == "CONTROL": st.success("✅ ¡Registro guardado! Muchas gracias por tu compromiso.")
+                        else:
+                            if dia_semana in [0, 2, 4]: st.success("✅ ¡Reporte guardado! Te esperamos hoy para tu sesión de entrenamiento.")
+                            else: st.success("✅ ¡Reporte guardado! Excelente trabajo monitoreando tu recuperación de hoy.")
+                    except Exception as e: st.error(f"Error de conexión: {e}")
+        cuestionario_triage()
 
 # =====================================================================
 # 🔬 UNIVERSO 2: INVESTIGADOR (RCT, SOP Y DOSIFICACIÓN L-M-V)
 # =====================================================================
 elif st.session_state.role == "Investigador":
+    import pandas as pd
+    metricas.marcar_fase("radar")
     st.title("📡 Radar de Monitoreo")
     
     # ⚠️ ENLACE REAL DE STREAMLIT
     url_app = "https://plataforma-oncologia-4zktoxiwtebukcvht57msb.streamlit.app/?embed=true" 
 
     try:
-        res_pacientes = supabase.table("pacientes").select("*").execute()
-        res_registros = supabase.table("registros_diarios").select("*").eq("fecha", hoy_str).execute()
+        # Radar e histórico del último paciente seleccionado viajan en paralelo
+        pagina_radar = st.session_state.get("pagina_radar", 1) - 1
+        pac_previo = st.session_state.get("paciente_sel")
+        lecturas = {"radar": lambda: datos.leer_radar(supabase, hoy_str, pagina_radar)}
+        if pac_previo: lecturas["historial"] = lambda: datos.leer_historial(supabase, pac_previo)
+        lecturas["alertas"] = lambda: alertas.leer_ventana(supabase, hoy_str)
+        resultados, errores = datos.leer_en_paralelo(lecturas)
+        if "radar" in errores:
+            # Sin respuesta a tiempo se sirve la foto compartida de hoy, si existe
+            if datos.radar.fecha != hoy_str or not datos.radar.filas: st.error(f"Error de red: {errores['radar']}"); st.stop()
+            resultados["radar"] = datos.radar.pagina(pagina_radar, datos.RADAR_TAM_PAGINA)
+            st.warning(f"⏳ El radar no respondió a tiempo ({errores['radar']}): se muestran los datos al {hora_local(datos.radar.sincronizado)}.")
+        filas_radar, total_pacientes = resultados["radar"]
+        if total_pacientes == 0: st.stop()
+        if datos.estado.sin_conexion_desde and datos.radar.sincronizado:
+            st.warning(f"📴 Sin conexión con la base: el radar muestra los datos al {hora_local(datos.radar.sincronizado)}.")
+        df_radar = esquema.tipar(pd.DataFrame(filas_radar))
         
-        df_pacientes = pd.DataFrame(res_pacientes.data)
-        if df_pacientes.empty: st.stop()
-            
-        if len(res_registros.data) > 0: df_radar = pd.merge(df_pacientes, pd.DataFrame(res_registros.data), on="id_paciente", how="left")
-        else: df_radar = df_pacientes.copy(); df_radar[["estado_triage", "semaforo", "eficiencia_sueno", "fatiga_bfi", "dolor_maximo", "zonas_dolor", "estado_sesion", "estado_animo"]] = None
-                
-        if 'grupo' not in df_radar.columns: df_radar['grupo'] = 'EXPERIMENTAL'
-        if 'fecha_inicio' not in df_radar.columns: df_radar['fecha_inicio'] = None
-        if 'estado_animo' not in df_radar.columns: df_radar['estado_animo'] = 'S/D'
-            
-        df_mostrar = df_radar.rename(columns={
-            "id_paciente": "ID Paciente", "grupo": "Brazo", "cohorte": "Cohorte", "estado_triage": "Estado AM",
-            "semaforo": "Semáforo", "estado_animo": "Ánimo", "eficiencia_sueno": "Eficiencia %", "fatiga_bfi": "Fatiga", "dolor_maximo": "Dolor"
-        }).fillna({"Brazo": "EXPERIMENTAL", "Estado AM": "Pendiente", "Semáforo": "⚪", "Ánimo": "S/D", "Eficiencia %": 0.0, "Fatiga": 0, "Dolor": 0})
+        # Feed de alertas de tendencia de toda la cohorte (no sólo la página visible)
+        if "alertas" in errores: st.caption(f"⏳ Alertas de tendencia no disponibles por ahora ({errores['alertas']}).")
+        else:
+            feed = alertas.escanear(resultados["alertas"], datos.radar.todas(), hoy_str)
+            if feed.empty: st.caption(f"✅ Sin alertas de tendencia en los últimos {alertas.VENTANA_DIAS} días.")
+            else:
+                with st.expander(f"🚨 Alertas de tendencia: {len(feed)} ({(feed['severidad'] == alertas.ALTA).sum()} altas)", expanded=bool((feed["severidad"] == alertas.ALTA).any())):
+                    st.dataframe(feed, hide_index=True, use_container_width=True, column_order=["severidad", "id_paciente", "grupo", "alerta", "detalle"],
+                                 column_config={"severidad": "Severidad", "id_paciente": "ID Paciente", "grupo": "Brazo", "alerta": "Alerta", "detalle": "Detalle"})
+                    st.caption(f"Ventana de {alertas.VENTANA_DIAS} días · {len(resultados['alertas'])} registros · escaneo {alertas.ultimo_escaneo_ms or 0:.0f} ms")
         
         st.subheader("👥 Estado de las Cohortes (Hoy)")
-        st.dataframe(df_mostrar[["ID Paciente", "Brazo", "Cohorte", "Estado AM", "Semáforo", "Ánimo", "Eficiencia %", "Fatiga", "Dolor"]].set_index("ID Paciente"), use_container_width=True)
+        
+        # Con auto-actualización sólo se re-ejecuta este fragmento (delta de la foto compartida)
+        @st.fragment(run_every=st.session_state.get("auto_radar") or None)
+        def tabla_radar():
+            filas, _ = datos.leer_radar(supabase, hoy_str, pagina_radar)
+            st.dataframe(esquema.tipar(pd.DataFrame(filas)), hide_index=True, use_container_width=True,
+                         column_order=["id_paciente", "grupo", "cohorte", "estado_triage", "semaforo", "estado_animo", "eficiencia_sueno", "fatiga_bfi", "dolor_maximo"],
+                         column_config={"id_paciente": "ID Paciente", "grupo": "Brazo", "cohorte": "Cohorte", "estado_triage": "Estado AM", "semaforo": "Semáforo", "estado_animo": "Ánimo", "eficiencia_sueno": "Eficiencia %", "fatiga_bfi": "Fatiga", "dolor_maximo": "Dolor"})
+            st.caption(f"🔄 Datos al {hora_local(datos.radar.sincronizado) if datos.radar.sincronizado else '—'} · último refresco: {datos.radar.filas_ultimo_refresco} filas recibidas · marca {datos.radar.marca or '—'}")
+        tabla_radar()
+        
+        @st.fragment
+        def panel_brazos():
+            with st.expander("📊 Evolución por Cohorte y Brazo (resumen semanal)"):
+                if st.button("🔄 Recalcular resúmenes"):
+                    with st.spinner("Actualizando semanas con registros nuevos..."): n_pac, n_filas = analitica.actualizar_resumen(supabase)
+                    st.success(f"✅ {n_pac} pacientes recalculados ({n_filas} semanas).")
+                resumen = analitica.leer_resumen(supabase)
+                if not resumen: st.info("Aún no hay resúmenes semanales. Pulsa 'Recalcular resúmenes'."); return
+                df_brazos = analitica.agregados_por_brazo(pd.DataFrame(resumen))
+                df_brazos["Brazo"] = df_brazos["cohorte"].fillna("S/D") + " · " + df_brazos["grupo"]
+                indicadores = {"fatiga_media": "Fatiga media", "dolor_medio": "Dolor medio", "eficiencia_media": "Eficiencia de sueño %", "adherencia_triage": "Adherencia al triage",
+                               "adherencia_sesiones": "Adherencia a sesiones", "tonelaje_medio": "Tonelaje (Kg)", "rpe_medio": "RPE medio"}
+                indicador = st.selectbox("Indicador", list(indicadores), format_func=indicadores.get)
+                st.line_chart(df_brazos.pivot(index="semana", columns="Brazo", values=indicador))
+                st.caption(f"Semana de ensayo desde fecha_inicio · {df_brazos.groupby('Brazo')['pacientes'].max().to_dict()} pacientes por brazo")
+        panel_brazos()
+        n_paginas = -(-total_pacientes // datos.RADAR_TAM_PAGINA)
+        if n_paginas > 1:
+            st.number_input(f"Página ({total_pacientes} participantes)", 1, n_paginas, step=1, key="pagina_radar")
         st.divider()
         
         if not df_radar.empty:
-            paciente_sel = st.selectbox("📋 Seleccionar paciente para la sesión:", df_radar["id_paciente"].tolist())
+            paciente_sel = st.selectbox("📋 Seleccionar paciente para la sesión:", df_radar["id_paciente"].tolist(), key="paciente_sel")
             datos_pac = df_radar[df_radar["id_paciente"] == paciente_sel].iloc[0]
             grupo_sel = str(datos_pac.get("grupo", "EXPERIMENTAL")).upper()
             cohorte_sel = str(datos_pac.get("cohorte", "MAMA")).upper()
@@ -237,31 +360,26 @@ elif st.session_state.role == "Investigador":
                 if pd.isna(f_inicio) or f_inicio is None:
                     st.warning("⚠️ Este paciente aún no ha iniciado la Semana 1 del ensayo clínico.")
                     if st.button(f"🔴 Fijar HOY ({hoy_str}) como INICIO SEMANA 1", type="primary"):
-                        supabase.table("pacientes").update({"fecha_inicio": hoy_str}).eq("id_paciente", paciente_sel).execute()
-                        st.success("✅ Fecha de inicio registrada. Por favor, selecciona otro paciente y vuelve a este para recargar.")
+                        if datos.actualizar(supabase, "pacientes", {"fecha_inicio": hoy_str}, {"id_paciente": paciente_sel}) is None: st.warning("📴 Sin conexión: la fecha de inicio quedó en cola y se registrará al volver la red.")
+                        else: st.success("✅ Fecha de inicio registrada."); st.rerun()
                 else:
-                    st.info(f"✅ El participante inició el estudio el **{f_inicio}**.")
+                    st.info(f"✅ El participante inició el estudio el **{pd.Timestamp(f_inicio):%Y-%m-%d}**.")
                     st.success(f"🚀 **Actualmente cursando la {semana_actual} del ensayo.**")
                     
                 st.divider()
                 st.markdown(f"### 📈 Evolución Clínica Integrada: `{paciente_sel}`")
+                metricas.marcar_fase("historial")
                 
                 # --- NUEVOS GRÁFICOS INTERACTIVOS ---
-                res_hist = supabase.table("registros_diarios").select("fecha, fatiga_bfi, dolor_maximo, eficiencia_sueno, kilos_ejercicio_1, rpe_sesion, estado_animo, calidad_sueno, exposicion_sol_min").eq("id_paciente", paciente_sel).order("fecha").execute()
+                if paciente_sel != pac_previo: historial = datos.leer_historial(supabase, paciente_sel)
+                elif "historial" in errores: historial = []; st.warning(f"⏳ Histórico no disponible por ahora ({errores['historial']}).")
+                else: historial = resultados["historial"]
+                historial_al = datos.historial_al(paciente_sel)
+                if historial_al and time.time() - historial_al > datos.cache.ttl: st.caption(f"🕒 Histórico con datos al {hora_local(historial_al)} (actualizando en segundo plano).")
                 
-                if len(res_hist.data) > 1:
-                    df_hist = pd.DataFrame(res_hist.data)
-                    df_hist["fecha"] = pd.to_datetime(df_hist["fecha"]).dt.strftime('%d-%m')
-                    df_hist.set_index("fecha", inplace=True)
-                    
-                    # Convertimos textos a números para graficarlos
-                    map_animo = {"Muy mal": 1, "Mal": 2, "Regular": 3, "Bien": 4, "Muy Bien": 5, "Excelente": 6}
-                    map_sueno = {"Malo": 1, "Regular": 2, "Bueno": 3, "Reparador": 4}
-                    
-                    if "estado_animo" in df_hist.columns: df_hist["Puntaje Ánimo (1-6)"] = df_hist["estado_animo"].map(map_animo).fillna(0)
-                    if "calidad_sueno" in df_hist.columns: df_hist["Puntaje Sueño (1-4)"] = df_hist["calidad_sueno"].map(map_sueno).fillna(0)
-                        
-                    df_hist.fillna(0, inplace=True)
+                if len(historial) > 1:
+                    # Textos convertidos a números para graficarlos (preparado una vez por versión del histórico)
+                    df_hist = analitica.preparar_historial(historial)
                     
                     c_g1, c_g2 = st.columns(2)
                     with c_g1: 
@@ -284,12 +402,11 @@ elif st.session_state.role == "Investigador":
                 else: 
                     st.info("Aún no hay datos históricos suficientes para dibujar las curvas.")
 
+            metricas.marcar_fase("sesion")
             with tab_qr:
                 st.markdown("### 🖨️ Instalación de App en Celular del Paciente")
-                qr = qrcode.QRCode(version=1, box_size=8, border=2); qr.add_data(url_app); qr.make(fit=True)
-                img_qr = qr.make_image(fill_color="black", back_color="white"); buf = BytesIO(); img_qr.save(buf, format="PNG")
                 col_qr1, col_qr2 = st.columns([1, 2])
-                with col_qr1: st.image(buf, caption="Escanea con la cámara", use_container_width=True)
+                with col_qr1: st.image(generar_qr_png(url_app), caption="Escanea con la cámara", use_container_width=True)
                 with col_qr2: st.write("Pídele al paciente que escanee este código en su primera visita de familiarización para instalar la App.")
 
             with tab_hoy:
@@ -306,17 +423,17 @@ elif st.session_state.role == "Investigador":
                     animo = str(datos_pac.get("estado_animo", "Bien"))
                     if animo in ["Muy mal", "Mal"]:
                         c_alerta2.error(f"🧠 Alerta Psicológica: El paciente reportó un estado de ánimo '{animo}'.")
-                    elif float(datos_pac.get("dolor_maximo", 0)) > 0: 
-                        c_alerta2.error(f"📍 Alerta Biomecánica: Foco de dolor en {datos_pac.get('zonas_dolor', '')}.")
+                    elif pd.notna(datos_pac.get("dolor_maximo")) and datos_pac.get("dolor_maximo") > 0: 
+                        c_alerta2.error(f"📍 Alerta Biomecánica: Foco de dolor en {esquema.zonas(datos_pac.get('zonas_dolor', 0))}.")
                     st.markdown("---")
                     
                     if grupo_sel == "CONTROL":
                         st.info("ℹ️ **GRUPO CONTROL: Monitoreo Activo (Usual Care)**")
                         if st.button("Marcar Signos Vitales Revisados ✅", type="primary"):
-                            supabase.table("registros_diarios").update({
+                            res = datos.actualizar(supabase, "registros_diarios", {
                                 "estado_sesion": "Revisado (Control)", "ejercicio_1": "Ninguno", "kilos_ejercicio_1": 0.0, "ejercicio_2": "Ninguno", "kilos_ejercicio_2": 0.0, "ejercicio_3": "Ninguno", "kilos_ejercicio_3": 0.0, "ejercicio_4": "Ninguno", "kilos_ejercicio_4": 0.0, "rpe_sesion": 0
-                            }).eq("id_paciente", paciente_sel).eq("fecha", hoy_str).execute()
-                            st.success("✅ Registro de monitorización guardado en el eCRF.")
+                            }, {"id_paciente": paciente_sel, "fecha": hoy_str})
+                            confirmar_escritura(res, "✅ Registro de monitorización guardado en el eCRF.")
                             
                     else:
                         if dia_semana not in [0, 2, 4]:
@@ -350,43 +467,49 @@ elif st.session_state.role == "Investigador":
                             
                             if "ROJO" in semaforo:
                                 if st.button("Guardar Ejecución Protocolo Vagal 🫁"):
-                                    supabase.table("registros_diarios").update({
+                                    res = datos.actualizar(supabase, "registros_diarios", {
                                         "estado_sesion": "Vagal Completado", "protocolo_vagal": True, "rpe_sesion": 0,
                                         "ejercicio_1": "Protocolo Vagal", "kilos_ejercicio_1": 0, "ejercicio_2": "Ninguno", "kilos_ejercicio_2": 0, "ejercicio_3": "Ninguno", "kilos_ejercicio_3": 0, "ejercicio_4": "Ninguno", "kilos_ejercicio_4": 0
-                                    }).eq("id_paciente", paciente_sel).eq("fecha", hoy_str).execute()
-                                    st.success("Guardado.")
+                                    }, {"id_paciente": paciente_sel, "fecha": hoy_str})
+                                    confirmar_escritura(res, "Guardado.")
                             else:
                                 if dias_trans < 0:
                                     st.warning("El paciente inicia el protocolo en el futuro. No se pueden registrar cargas hoy.")
                                 else:
-                                    st.markdown("#### 🏋️‍♂️ Registro de Cargas Reales (Kg)")
-                                    rutina = obtener_rutina(cohorte_sel, dia_semana)
+                                    @st.fragment
+                                    @metricas.medir_fragmento("Investigador")
+                                    def cuaderno_cargas(paciente_sel, cohorte_sel):
+                                        st.markdown("#### 🏋️‍♂️ Registro de Cargas Reales (Kg)")
+                                        rutina = obtener_rutina(cohorte_sel, dia_semana)
                                     
-                                    c1, c2 = st.columns(2)
-                                    with c1:
-                                        k1 = st.number_input(f"1. {rutina[0]}:", min_value=0.0, step=2.5)
-                                        k3 = st.number_input(f"3. {rutina[2]}:", min_value=0.0, step=2.5)
-                                    with c2:
-                                        k2 = st.number_input(f"2. {rutina[1]}:", min_value=0.0, step=2.5)
-                                        k4 = st.number_input(f"4. {rutina[3]}:", min_value=0.0, step=2.5)
+                                        c1, c2 = st.columns(2)
+                                        with c1:
+                                            k1 = st.number_input(f"1. {rutina[0]}:", min_value=0.0, step=2.5)
+                                            k3 = st.number_input(f"3. {rutina[2]}:", min_value=0.0, step=2.5)
+                                        with c2:
+                                            k2 = st.number_input(f"2. {rutina[1]}:", min_value=0.0, step=2.5)
+                                            k4 = st.number_input(f"4. {rutina[3]}:", min_value=0.0, step=2.5)
                                         
-                                    if cohorte_sel == "MAMA" and ("Press" in rutina[1] or "Elevaciones" in rutina[1]) and k2 > 25.0:
-                                        st.error("🚨 **ALERTA CLÍNICA:** La carga en tren superior podría presentar riesgo de Linfedema. Verifique.")
+                                        if cohorte_sel == "MAMA" and ("Press" in rutina[1] or "Elevaciones" in rutina[1]) and k2 > 25.0:
+                                            st.error("🚨 **ALERTA CLÍNICA:** La carga en tren superior podría presentar riesgo de Linfedema. Verifique.")
                                     
-                                    rpe = st.slider("Escala de Borg CR10 (Carga Interna de la Sesión Completa):", 0, 10, 6)
+                                        rpe = st.slider("Escala de Borg CR10 (Carga Interna de la Sesión Completa):", 0, 10, 6)
                                     
-                                    if st.button("Guardar Sesión L-M-V 💾", type="primary"):
-                                        try:
-                                            datos_sesion = {
-                                                "estado_sesion": "Completado", "rpe_sesion": rpe,
-                                                "ejercicio_1": rutina[0], "kilos_ejercicio_1": float(k1),
-                                                "ejercicio_2": rutina[1], "kilos_ejercicio_2": float(k2),
-                                                "ejercicio_3": rutina[2], "kilos_ejercicio_3": float(k3),
-                                                "ejercicio_4": rutina[3], "kilos_ejercicio_4": float(k4)
-                                            }
-                                            supabase.table("registros_diarios").update(datos_sesion).eq("id_paciente", paciente_sel).eq("fecha", hoy_str).execute()
-                                            st.success("✅ ¡Datos del microciclo sincronizados con éxito (Tidy Data listo para publicación)!")
-                                        except Exception as e:
-                                            st.error(f"Error al guardar: {e}. Asegúrate de haber agregado las columnas ejercicio_3 y ejercicio_4 en SQL.")
+                                        if st.button("Guardar Sesión L-M-V 💾", type="primary"):
+                                            try:
+                                                datos_sesion = {
+                                                    "estado_sesion": "Completado", "rpe_sesion": rpe,
+                                                    "ejercicio_1": rutina[0], "kilos_ejercicio_1": float(k1),
+                                                    "ejercicio_2": rutina[1], "kilos_ejercicio_2": float(k2),
+                                                    "ejercicio_3": rutina[2], "kilos_ejercicio_3": float(k3),
+                                                    "ejercicio_4": rutina[3], "kilos_ejercicio_4": float(k4)
+                                                }
+                                                res = datos.actualizar(supabase, "registros_diarios", datos_sesion, {"id_paciente": paciente_sel, "fecha": hoy_str})
+                                                confirmar_escritura(res, "✅ ¡Datos del microciclo sincronizados con éxito (Tidy Data listo para publicación)!")
+                                            except Exception as e:
+                                                st.error(f"Error al guardar: {e}. Asegúrate de haber agregado las columnas ejercicio_3 y ejercicio_4 en SQL.")
+                                    cuaderno_cargas(paciente_sel, cohorte_sel)
                             
-    except Exception as e: st.error(f"Error de sistema: {e}")
\ No newline at end of file
+    except Exception as e: st.error(f"Error de sistema: {e}")
+
+metricas.fin_rerun()
\ No newline at end of file
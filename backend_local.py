@@ -0,0 +1,307 @@
+import datetime
+import functools
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from multiprocessing.managers import BaseManager
+from zoneinfo import ZoneInfo
+
+# =====================================================================
+# 🧪 BACKEND LOCAL (SUSTITUTO EN MEMORIA DE SUPABASE)
+# =====================================================================
+# Implementa el subconjunto de la API de supabase-py que usa la plataforma
+# (table/select/eq/gt/gte/lt/lte/or_/order/limit/range/insert/update/upsert/execute)
+# sobre tablas en memoria, con las vistas v_radar_hoy y v_registros_export.
+# Permite inyectar latencia y fallos y cuenta las llamadas por tabla y operación.
+# Como PostgREST, ningún select devuelve más de max_filas filas (db-max-rows).
+# Se activa con BACKEND = "local" en .streamlit/secrets.toml.
+
+ZONA = ZoneInfo("America/Montevideo")
+
+class ErrorBackendLocal(Exception):
+    pass
+
+class Respuesta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+def _ahora():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+def _coincide(valor, op, ref):
+    if op == "is": return valor is None if str(ref).lower() == "null" else valor == ref
+    if valor is None: return False
+    if isinstance(valor, bool): ref = str(ref).lower() == "true" if isinstance(ref, str) else ref
+    elif isinstance(valor, (int, float)): ref = float(ref)
+    else: valor, ref = str(valor), str(ref)
+    if op == "eq": return valor == ref
+    if op == "neq": return valor != ref
+    if op == "gt": return valor > ref
+    if op == "gte": return valor >= ref
+    if op == "lt": return valor < ref
+    if op == "lte": return valor <= ref
+    raise ErrorBackendLocal(f"Operador no soportado: {op}")
+
+def _partir(texto):
+    # Separa por comas de primer nivel (respetando paréntesis)
+    partes, nivel, actual = [], 0, ""
+    for ch in texto:
+        if ch == "," and nivel == 0: partes.append(actual); actual = ""; continue
+        nivel += (ch == "(") - (ch == ")")
+        actual += ch
+    return partes + [actual] if actual else partes
+
+def _cumple_or(fila, texto):
+    def termino(t):
+        t = t.strip()
+        if t.startswith("and(") and t.endswith(")"): return all(termino(x) for x in _partir(t[4:-1]))
+        if t.startswith("or(") and t.endswith(")"): return _cumple_or(fila, t[3:-1])
+        col, op, ref = t.split(".", 2)
+        return _coincide(fila.get(col), op, ref)
+    return any(termino(t) for t in _partir(texto))
+
+def _cumple(fila, filtro):
+    col, op, ref = filtro
+    if op == "or": return _cumple_or(fila, ref)
+    if op == "in": return str(fila.get(col)) in ref
+    return _coincide(fila.get(col), op, ref)
+
+class _Consulta:
+    # Los filtros son tuplas (columna, operador, valor): la consulta es serializable
+    # y puede ejecutarse en otro proceso (ver servir / conectar).
+    def __init__(self, backend, tabla):
+        self._b = backend
+        self._tabla = tabla
+        self._op = "select"
+        self._columnas = "*"
+        self._contar = False
+        self._filtros = []
+        self._orden = []
+        self._desde = 0
+        self._limite = None
+        self._valores = None
+        self._conflicto = None
+
+    # --- operaciones ---
+    def select(self, columnas="*", count=None):
+        self._columnas, self._contar = columnas, count is not None
+        return self
+    def insert(self, filas):
+        self._op, self._valores = "insert", filas
+        return self
+    def update(self, valores):
+        self._op, self._valores = "update", valores
+        return self
+    def upsert(self, filas, on_conflict=None):
+        self._op, self._valores, self._conflicto = "upsert", filas, on_conflict
+        return self
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # --- filtros y modificadores ---
+    def _filtro(self, col, op, ref):
+        self._filtros.append((col, op, ref))
+        return self
+    def eq(self, col, ref): return self._filtro(col, "eq", ref)
+    def neq(self, col, ref): return self._filtro(col, "neq", ref)
+    def gt(self, col, ref): return self._filtro(col, "gt", ref)
+    def gte(self, col, ref): return self._filtro(col, "gte", ref)
+    def lt(self, col, ref): return self._filtro(col, "lt", ref)
+    def lte(self, col, ref): return self._filtro(col, "lte", ref)
+    def in_(self, col, refs): return self._filtro(col, "in", [str(r) for r in refs])
+    def or_(self, texto): return self._filtro(None, "or", texto)
+    def order(self, col, desc=False):
+        self._orden.append((col, desc))
+        return self
+    def limit(self, n):
+        self._limite = n
+        return self
+    def range(self, inicio, fin):
+        self._desde, self._limite = inicio, fin - inicio + 1
+        return self
+
+    def execute(self):
+        return self._b.ejecutar(self)
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "_b"}
+
+class BackendLocal:
+    def __init__(self, latencia=0.0, variacion=0.0, tasa_fallos=0.0, semilla=None, max_filas=1000):
+        self.latencia = latencia
+        self.max_filas = max_filas
+        self.variacion = variacion
+        self.tasa_fallos = tasa_fallos
+        self.caido = False   # True simula un corte total (p.ej. para probar la cola offline)
+        # Como el cliente de supabase-py: identifica el backend en la caché en disco. Las
+        # tablas viven en memoria, así que cada instancia es un backend distinto.
+        self.supabase_url = f"local://{uuid.uuid4().hex}"
+        self.llamadas = Counter()
+        self.tablas = {"pacientes": [], "registros_diarios": [], "resumen_semanal": [], "resumen_corridas": []}
+        self._ids = itertools.count(1)
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+        self.vistas = {"v_radar_hoy": self._vista_radar_hoy, "v_registros_export": self._vista_export}
+        # Restricciones únicas (ver sql/001_registros_unicos.sql)
+        self.unicas = {"pacientes": ("id_paciente",), "registros_diarios": ("id_paciente", "fecha"), "resumen_semanal": ("id_paciente", "semana")}
+
+    def table(self, tabla):
+        return _Consulta(self, tabla)
+
+    def reiniciar_contadores(self):
+        with self._lock: self.llamadas.clear()
+
+    def contadores(self):
+        with self._lock: return dict(self.llamadas)
+
+    def url(self):
+        return self.supabase_url
+
+    # --- vistas del servidor ---
+    def _vista_radar_hoy(self):
+        hoy = str(datetime.datetime.now(ZONA).date())
+        regs = {r["id_paciente"]: r for r in self.tablas["registros_diarios"] if str(r.get("fecha")) == hoy}
+        filas = []
+        for p in self.tablas["pacientes"]:
+            r = regs.get(p["id_paciente"], {})
+            filas.append({
+                "id_paciente": p["id_paciente"], "grupo": p.get("grupo") or "EXPERIMENTAL", "cohorte": p.get("cohorte"), "fecha_inicio": p.get("fecha_inicio"),
+                "estado_triage": r.get("estado_triage") or "Pendiente", "semaforo": r.get("semaforo") or "⚪", "estado_animo": r.get("estado_animo") or "S/D",
+                "eficiencia_sueno": r.get("eficiencia_sueno") or 0, "fatiga_bfi": r.get("fatiga_bfi") or 0, "dolor_maximo": r.get("dolor_maximo") or 0,
+                "zonas_dolor": r.get("zonas_dolor"), "calidad_sueno": r.get("calidad_sueno"), "estado_sesion": r.get("estado_sesion"),
+                "actualizado": max(x for x in (p.get("updated_at"), r.get("updated_at")) if x),
+            })
+        return filas
+
+    def _vista_export(self):
+        pacientes = {p["id_paciente"]: p for p in self.tablas["pacientes"]}
+        filas = []
+        for r in self.tablas["registros_diarios"]:
+            p = pacientes.get(r["id_paciente"])
+            if p is None: continue
+            filas.append({**r, "cohorte": p.get("cohorte"), "grupo": p.get("grupo") or "EXPERIMENTAL", "fecha_inicio": p.get("fecha_inicio"),
+                          "actualizado": max(r["updated_at"], p["updated_at"])})
+        return filas
+
+    # --- ejecución ---
+    def _clave_unica(self, tabla, fila, columnas=None):
+        columnas = columnas or self.unicas.get(tabla)
+        return tuple(str(fila.get(c)) for c in columnas) if columnas else None
+
+    def _insertar(self, tabla, fila):
+        fila = {**fila, "updated_at": _ahora()}
+        if tabla == "registros_diarios": fila.setdefault("id", next(self._ids))
+        clave = self._clave_unica(tabla, fila)
+        if clave and any(self._clave_unica(tabla, f) == clave for f in self.tablas[tabla]):
+            raise ErrorBackendLocal(f'duplicate key value violates unique constraint on {tabla} {clave}')
+        self.tablas[tabla].append(fila)
+        return fila
+
+    def ejecutar(self, c):
+        with self._lock: self.llamadas[(c._tabla, c._op)] += 1
+        if self.latencia or self.variacion: time.sleep(max(0.0, self.latencia + self._azar.uniform(-self.variacion, self.variacion)))
+        if self.caido: raise ConnectionError(f"Backend caído: {c._op} {c._tabla}")
+        if self.tasa_fallos and self._azar.random() < self.tasa_fallos: raise ConnectionError(f"Fallo inyectado en {c._op} {c._tabla}")
+        with self._lock:
+            if c._op == "select":
+                origen = self.vistas[c._tabla]() if c._tabla in self.vistas else self.tablas[c._tabla]
+                filas = [f for f in origen if all(_cumple(f, filtro) for filtro in c._filtros)]
+                for col, desc in reversed(c._orden): filas.sort(key=lambda f: (f.get(col) is None, f.get(col)), reverse=desc)
+                total = len(filas)
+                limite = self.max_filas if c._limite is None else min(c._limite, self.max_filas or c._limite)
+                filas = filas[c._desde:None if limite is None else c._desde + limite]
+                if c._columnas.strip() != "*":
+                    cols = [x.strip() for x in c._columnas.split(",")]
+                    filas = [{k: f.get(k) for k in cols} for f in filas]
+                return Respuesta([dict(f) for f in filas], total if c._contar else None)
+            lote = c._valores if isinstance(c._valores, list) else [c._valores]
+            if c._op == "insert":
+                return Respuesta([dict(self._insertar(c._tabla, f)) for f in lote])
+            if c._op == "update":
+                tocadas = [f for f in self.tablas[c._tabla] if all(_cumple(f, filtro) for filtro in c._filtros)]
+                for f in tocadas: f.update(c._valores, updated_at=_ahora())
+                return Respuesta([dict(f) for f in tocadas])
+            if c._op == "upsert":
+                columnas = tuple(x.strip() for x in c._conflicto.split(",")) if c._conflicto else None
+                guardadas = []
+                for nueva in lote:
+                    clave = self._clave_unica(c._tabla, nueva, columnas)
+                    existente = next((f for f in self.tablas[c._tabla] if self._clave_unica(c._tabla, f, columnas) == clave), None)
+                    if existente is None: guardadas.append(dict(self._insertar(c._tabla, nueva)))
+                    else: existente.update(nueva, updated_at=_ahora()); guardadas.append(dict(existente))
+                return Respuesta(guardadas)
+            if c._op == "delete":
+                quedan = [f for f in self.tablas[c._tabla] if not all(_cumple(f, filtro) for filtro in c._filtros)]
+                borradas = [f for f in self.tablas[c._tabla] if f not in quedan]
+                self.tablas[c._tabla] = quedan
+                return Respuesta(borradas)
+        raise ErrorBackendLocal(f"Operación no soportada: {c._op}")
+
+    # --- datos de ejemplo ---
+    def sembrar(self, n_pacientes=20, dias=30, semilla=0):
+        azar = random.Random(semilla)
+        hoy = datetime.datetime.now(ZONA).date()
+        animos = ["Muy mal", "Mal", "Regular", "Bien", "Muy Bien", "Excelente"]
+        with self._lock:
+            for i in range(1, n_pacientes + 1):
+                inicio = hoy - datetime.timedelta(days=dias)
+                self._insertar("pacientes", {"id_paciente": f"P{i:04d}", "pin": f"{1000 + i}", "cohorte": "MAMA" if i % 2 else "PROSTATA",
+                                             "grupo": "EXPERIMENTAL" if i % 3 else "CONTROL", "fecha_inicio": str(inicio)})
+                for d in range(dias):
+                    if azar.random() < 0.15: continue
+                    fecha = inicio + datetime.timedelta(days=d)
+                    self._insertar("registros_diarios", {
+                        "id_paciente": f"P{i:04d}", "fecha": str(fecha), "estado_triage": "Completado", "semaforo": "🟢 VERDE", "version_reglas": "v1",
+                        "eficiencia_sueno": round(azar.uniform(70, 98), 1), "latencia_min": azar.choice([5, 15, 30, 60]), "despertares_veces": azar.randint(0, 4),
+                        "calidad_sueno": azar.choice(["Malo", "Regular", "Bueno", "Reparador"]), "estado_animo": azar.choice(animos),
+                        "exposicion_sol_min": azar.choice([0, 15, 30, 60]), "fatiga_bfi": azar.randint(0, 9), "estres_nccn": azar.randint(0, 9),
+                        "dolor_maximo": azar.choice([0, 0, 0, 3, 6]), "zonas_dolor": "Ninguna",
+                        "estado_sesion": "Completado" if fecha.weekday() in (0, 2, 4) else None, "rpe_sesion": azar.randint(4, 8) if fecha.weekday() in (0, 2, 4) else None,
+                        **{f"kilos_ejercicio_{k}": float(azar.choice([10, 15, 20, 25])) if fecha.weekday() in (0, 2, 4) else None for k in range(1, 5)},
+                    })
+        return self
+
+# Instancia única por proceso: la app (vía init_connection) y el arnés de carga
+# comparten las mismas tablas y contadores.
+_compartido = None
+_lock_compartido = threading.Lock()
+
+def compartido(latencia=0.0, variacion=0.0, tasa_fallos=0.0, n_pacientes=20, dias=30):
+    global _compartido
+    with _lock_compartido:
+        if _compartido is None: _compartido = BackendLocal(latencia, variacion, tasa_fallos).sembrar(n_pacientes, dias)
+        return _compartido
+
+# --- Backend compartido entre procesos (arnés de carga con varios workers) ---
+class _Gestor(BaseManager):
+    pass
+
+class _ClienteRemoto:
+    # Mismo API que BackendLocal, pero cada execute() viaja al proceso servidor
+    def __init__(self, proxy): self._proxy, self.supabase_url = proxy, proxy.url()
+    def table(self, tabla): return _Consulta(self, tabla)
+    def ejecutar(self, consulta): return self._proxy.ejecutar(consulta)
+    def reiniciar_contadores(self): self._proxy.reiniciar_contadores()
+    def contadores(self): return self._proxy.contadores()
+
+def servir(authkey=b"dtx-carga", **config):
+    # Levanta un proceso servidor con el backend compartido (config de compartido());
+    # devuelve (gestor, dirección) para conectar() desde cada worker.
+    _Gestor.register("backend", callable=functools.partial(compartido, **config), exposed=("ejecutar", "reiniciar_contadores", "contadores", "url"))
+    gestor = _Gestor(address=("127.0.0.1", 0), authkey=authkey)
+    gestor.start()
+    return gestor, gestor.address
+
+def conectar(direccion, authkey=b"dtx-carga"):
+    # Usado en cada worker: init_connection devolverá este cliente remoto
+    global _compartido
+    _Gestor.register("backend")
+    gestor = _Gestor(address=direccion, authkey=authkey)
+    gestor.connect()
+    _compartido = _ClienteRemoto(gestor.backend())
+    return _compartido
@@ -0,0 +1,126 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# =====================================================================
+# 💾 INSTANTÁNEAS EN DISCO + COLA DE ESCRITURAS PENDIENTES
+# =====================================================================
+# Respaldo local (SQLite) de la capa de datos. Cada lectura que llega del backend
+# se guarda aquí; si el backend cae o el contenedor se reinicia, el tablero arranca
+# con la última foto conocida en vez de quedar en blanco. Las escrituras que no
+# pudieron enviarse esperan en `cola` hasta que vuelva la conexión.
+# Fotos y cola se separan por `origen` (URL del backend, ver datos.usar_backend):
+# otro despliegue o el backend en memoria de una prueba no ve lo de este.
+
+DIR_CACHE = os.environ.get("DTX_DIR_CACHE", ".cache_dtx")
+RUTA = os.path.join(DIR_CACHE, "dtx.sqlite")
+MAX_INTENTOS = 5
+origen = ""
+
+_lock = threading.Lock()
+_preparada = False
+
+def _conexion():
+    global _preparada
+    if not _preparada:
+        with _lock:
+            if not _preparada:
+                os.makedirs(DIR_CACHE, exist_ok=True)
+                with contextlib.closing(sqlite3.connect(RUTA)) as con, con:
+                    con.execute("PRAGMA journal_mode=WAL")
+                    con.execute("CREATE TABLE IF NOT EXISTS instantaneas (clave TEXT PRIMARY KEY, tabla TEXT NOT NULL, filtros TEXT NOT NULL, datos TEXT NOT NULL, guardado REAL NOT NULL, origen TEXT NOT NULL DEFAULT '')")
+                    con.execute("CREATE TABLE IF NOT EXISTS cola (clave TEXT PRIMARY KEY, tabla TEXT NOT NULL, operacion TEXT NOT NULL, valores TEXT NOT NULL, filtros TEXT, on_conflict TEXT, creado REAL NOT NULL, intentos INTEGER NOT NULL DEFAULT 0, ultimo_error TEXT, origen TEXT NOT NULL DEFAULT '')")
+                    # Archivos creados antes de separar por origen
+                    for tabla in ("instantaneas", "cola"):
+                        if "origen" not in {c[1] for c in con.execute(f"PRAGMA table_info({tabla})")}:
+                            con.execute(f"ALTER TABLE {tabla} ADD COLUMN origen TEXT NOT NULL DEFAULT ''")
+                _preparada = True
+    return contextlib.closing(sqlite3.connect(RUTA, timeout=10))
+
+def _json(valor):
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+def _clave(clave):
+    return _json([origen, clave])
+
+# --- INSTANTÁNEAS DE LECTURA ---
+def guardar_instantanea(clave, tabla, filtros, datos, guardado=None):
+    with _conexion() as con, con:
+        con.execute("INSERT OR REPLACE INTO instantaneas (clave, tabla, filtros, datos, guardado, origen) VALUES (?, ?, ?, ?, ?, ?)",
+                    (_clave(clave), tabla, _json(filtros), _json(datos), guardado or time.time(), origen))
+
+def leer_instantanea(clave):
+    # Devuelve (datos, epoch en que se guardaron) o None
+    with _conexion() as con:
+        fila = con.execute("SELECT datos, guardado FROM instantaneas WHERE clave = ?", (_clave(clave),)).fetchone()
+    return (json.loads(fila[0]), fila[1]) if fila else None
+
+def borrar_instantaneas(tabla, afectada):
+    # afectada(filtros) decide, con la misma regla que la caché en memoria, qué fotos
+    # pudo haber dejado viejas una escritura en `tabla`
+    with _conexion() as con, con:
+        filas = con.execute("SELECT clave, filtros FROM instantaneas WHERE tabla = ? AND origen = ?", (tabla, origen)).fetchall()
+        borrar = [(clave,) for clave, filtros in filas if afectada(json.loads(filtros))]
+        if borrar: con.executemany("DELETE FROM instantaneas WHERE clave = ?", borrar)
+    return len(borrar)
+
+# --- COLA DE ESCRITURAS ---
+def encolar(tabla, operacion, valores, filtros=None, on_conflict=None, clave=None):
+    # Con `clave` la cola deduplica: una escritura posterior sobre las mismas filas se
+    # fusiona con la pendiente (gana el último valor de cada columna) y conserva su turno.
+    clave = _clave(clave) if clave is not None else uuid.uuid4().hex
+    with _conexion() as con, con:
+        previa = con.execute("SELECT valores FROM cola WHERE clave = ?", (clave,)).fetchone()
+        if previa:
+            con.execute("UPDATE cola SET valores = ? WHERE clave = ?", (_json({**json.loads(previa[0]), **valores}), clave))
+        else:
+            con.execute("INSERT INTO cola (clave, tabla, operacion, valores, filtros, on_conflict, creado, origen) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (clave, tabla, operacion, _json(valores), _json(filtros) if filtros is not None else None, on_conflict, time.time(), origen))
+
+def superar(escritas):
+    # escritas: [(clave, columnas)] de escrituras que acaban de llegar al backend sin
+    # pasar por la cola. Una pendiente con la misma clave pierde esas columnas (la directa
+    # es más nueva) y, si no le queda nada más que la clave de conflicto, se borra.
+    escritas = {_clave(c): set(columnas) for c, columnas in escritas if c is not None}
+    if not escritas: return 0
+    claves, tocadas = list(escritas), 0
+    with _conexion() as con, con:
+        for i in range(0, len(claves), 500):
+            lote = claves[i:i + 500]
+            filas = con.execute(f"SELECT clave, valores, on_conflict FROM cola WHERE clave IN ({', '.join('?' * len(lote))})", lote).fetchall()
+            for clave, valores, on_conflict in filas:
+                fijas = {c.strip() for c in on_conflict.split(",")} if on_conflict else set()
+                resto = {c: v for c, v in json.loads(valores).items() if c in fijas or c not in escritas[clave]}
+                if set(resto) <= fijas: con.execute("DELETE FROM cola WHERE clave = ?", (clave,))
+                else: con.execute("UPDATE cola SET valores = ? WHERE clave = ?", (_json(resto), clave))
+            tocadas += len(filas)
+    return tocadas
+
+def pendiente(clave):
+    # La entrada tal como está ahora (o None si se envió o la superó una escritura directa)
+    with _conexion() as con:
+        fila = con.execute("SELECT valores FROM cola WHERE clave = ?", (clave,)).fetchone()
+    return json.loads(fila[0]) if fila else None
+
+def pendientes():
+    with _conexion() as con:
+        filas = con.execute("SELECT clave, tabla, operacion, valores, filtros, on_conflict, intentos FROM cola WHERE origen = ? ORDER BY creado", (origen,)).fetchall()
+    return [{"clave": c, "tabla": t, "operacion": o, "valores": json.loads(v), "filtros": json.loads(f) if f else None, "on_conflict": oc, "intentos": i}
+            for c, t, o, v, f, oc, i in filas]
+
+def quitar(clave):
+    with _conexion() as con, con: con.execute("DELETE FROM cola WHERE clave = ?", (clave,))
+
+def registrar_fallo(clave, error):
+    # Un rechazo del servidor (no de red) no se arregla reintentando para siempre:
+    # devuelve True si la escritura se descartó por agotar MAX_INTENTOS
+    with _conexion() as con, con:
+        con.execute("UPDATE cola SET intentos = intentos + 1, ultimo_error = ? WHERE clave = ?", (str(error)[:500], clave))
+        return con.execute("DELETE FROM cola WHERE clave = ? AND intentos >= ?", (clave, MAX_INTENTOS)).rowcount > 0
+
+def tamano_cola():
+    with _conexion() as con: return con.execute("SELECT COUNT(*) FROM cola WHERE origen = ?", (origen,)).fetchone()[0]
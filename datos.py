@@ -0,0 +1,476 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import cache_disco
+import metricas
+
+# =====================================================================
+# 🗄️ CAPA DE ACCESO A DATOS (CACHÉ TTL + INVALIDACIÓN POR ESCRITURA)
+# =====================================================================
+# Caché compartida por todas las sesiones del proceso: cada rerun de Streamlit
+# reutiliza las lecturas idénticas (tabla, filtros, proyección) hasta que vence
+# el TTL o hasta que una escritura toca filas que podrían estar en esa clave.
+# Vencido el TTL se sirve el dato viejo y se refresca en segundo plano
+# (stale-while-revalidate); cada carga se respalda en disco (cache_disco) para
+# arrancar en caliente y para seguir mostrando algo si el backend no responde.
+
+class EstadoConexion:
+    def __init__(self):
+        self.sin_conexion_desde = None
+        self.ultimo_error = None
+
+    def en_linea(self):
+        self.sin_conexion_desde = None
+
+    def caida(self, error):
+        if self.sin_conexion_desde is None: self.sin_conexion_desde = time.time()
+        self.ultimo_error = f"{type(error).__name__}: {error}"
+
+estado = EstadoConexion()
+
+def es_error_de_red(error):
+    # Sólo los fallos de transporte van a la cola; un rechazo del servidor (restricción,
+    # permisos) se propaga como siempre
+    redes = (ConnectionError, TimeoutError, OSError)
+    try:
+        import httpx
+        redes += (httpx.TransportError,)
+    except ImportError: pass
+    return isinstance(error, redes)
+
+class CacheLecturas:
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.desde_disco = 0
+        self._entradas = {}
+        self._versiones = {}
+        self._revalidando = set()
+        self._lock = threading.Lock()
+        self._lock_disco = threading.Lock()
+
+    def obtener(self, clave, cargar, ttl=None, persistir=True):
+        # Las entradas son (instante monotónico, datos, epoch de los datos)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and ahora - entrada[0] < (self.ttl if ttl is None else ttl):
+                self.aciertos += 1
+                return entrada[1]
+            if entrada is None and getattr(_sonda, "activa", False): raise _FueraDeMemoria()
+            self.fallos += 1
+            version = self._versiones.setdefault(clave, 0)
+        if entrada is None and persistir:
+            respaldo = cache_disco.leer_instantanea(clave)
+            if respaldo is not None:
+                entrada = (ahora - max(0.0, time.time() - respaldo[1]), respaldo[0], respaldo[1])
+                with self._lock:
+                    if self._versiones[clave] == version: entrada = self._entradas.setdefault(clave, entrada)
+                self.desde_disco += 1
+        if entrada is None: return self._cargar(clave, cargar, persistir)
+        self._revalidar(clave, cargar, persistir)
+        return entrada[1]
+
+    def _cargar(self, clave, cargar, persistir):
+        # Cada invalidación sube la versión de la clave: una carga que empezó antes de
+        # una escritura devuelve lo que leyó pero no lo deja en memoria ni en disco
+        with self._lock: version = self._versiones.setdefault(clave, 0)
+        datos = cargar()
+        guardado = time.time()
+        with self._lock:
+            vigente = self._versiones[clave] == version
+            if vigente: self._entradas[clave] = (time.monotonic(), datos, guardado)
+        if vigente and persistir:
+            with self._lock_disco:
+                if self._versiones[clave] == version: cache_disco.guardar_instantanea(clave, clave[0], clave[2], datos, guardado)
+        estado.en_linea()
+        return datos
+
+    def _revalidar(self, clave, cargar, persistir):
+        # Con el backend lento no se apilan refrescos sin límite: la clave que no entra
+        # se sirve vieja y vuelve a intentarlo en la próxima lectura
+        with self._lock:
+            if clave in self._revalidando or len(self._revalidando) >= MAX_REVALIDACIONES: return
+            self._revalidando.add(clave)
+        def tarea():
+            try: self._cargar(clave, cargar, persistir)
+            except Exception as e:
+                if not es_error_de_red(e): raise
+                estado.caida(e)
+            finally:
+                with self._lock: self._revalidando.discard(clave)
+        _pool_fondo.submit(tarea)
+
+    def datos_al(self, clave):
+        # Epoch de los datos que se están sirviendo para `clave` (None si no hay)
+        with self._lock: entrada = self._entradas.get(clave)
+        return entrada[2] if entrada else None
+
+    def invalidar(self, tabla, fila=None, columnas_modificadas=()):
+        for vista in DEPENDENCIAS.get(tabla, ()): self._invalidar(vista, fila, columnas_modificadas)
+        self._invalidar(tabla, fila, columnas_modificadas)
+
+    def _invalidar(self, tabla, fila, columnas_modificadas):
+        # Una clave queda afectada salvo que alguno de sus filtros contradiga la fila
+        # escrita. Si el filtro usa una columna que se está modificando, no podemos
+        # saber si la fila entra o sale del resultado: se invalida (también en disco,
+        # para que un reinicio no resucite la foto anterior a la escritura).
+        fila = fila or {}
+        def afectada(filtros): return not any(c not in columnas_modificadas and c in fila and str(fila[c]) != str(v) for c, v in filtros)
+        with self._lock:
+            for clave in self._versiones:
+                if clave[0] == tabla and afectada(clave[2]):
+                    self._versiones[clave] += 1
+                    self._entradas.pop(clave, None)
+        with self._lock_disco: cache_disco.borrar_instantaneas(tabla, afectada)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            for clave in self._versiones: self._versiones[clave] += 1
+
+    def estadisticas(self):
+        with self._lock: vigentes = len(self._entradas)
+        total = self.aciertos + self.fallos
+        return {"aciertos": self.aciertos, "fallos": self.fallos, "entradas": vigentes, "desde_disco": self.desde_disco, "tasa_aciertos": (self.aciertos / total) if total else 0.0}
+
+# Vistas del servidor que deben invalidarse cuando cambian sus tablas base
+DEPENDENCIAS = {
+    "pacientes": ("v_radar_hoy",),
+    "registros_diarios": ("v_radar_hoy",),
+}
+
+cache = CacheLecturas()
+_log = logging.getLogger("dtx.datos")
+
+# --- EJECUCIÓN INSTRUMENTADA (toda llamada al backend pasa por aquí) ---
+def _ejecutar(consulta, tabla, operacion, filtros=None):
+    if getattr(_sonda, "activa", False): raise _FueraDeMemoria()
+    with metricas.llamada(tabla, operacion, filtros) as registro:
+        res = consulta.execute()
+        registro.resultado(res.data)
+    return res
+
+# --- LECTURAS ---
+def _clave(tabla, columnas="*", filtros=None, orden=None):
+    return (tabla, columnas, tuple(sorted((filtros or {}).items())), orden)
+
+def leer(cliente, tabla, columnas="*", filtros=None, orden=None):
+    clave = _clave(tabla, columnas, filtros, orden)
+    def cargar():
+        consulta = cliente.table(tabla).select(columnas)
+        for col, valor in clave[2]: consulta = consulta.eq(col, valor)
+        if orden: consulta = consulta.order(orden)
+        return _ejecutar(consulta, tabla, "select", dict(clave[2])).data
+    return cache.obtener(clave, cargar)
+
+# Columnas del radar (vista v_radar_hoy, ver sql/002_vista_radar.sql)
+COLUMNAS_RADAR = "id_paciente, grupo, cohorte, fecha_inicio, estado_triage, semaforo, estado_animo, eficiencia_sueno, fatiga_bfi, dolor_maximo, zonas_dolor, calidad_sueno, estado_sesion"
+RADAR_TAM_PAGINA = 200
+RADAR_TTL = 10
+# Margen contra transacciones que confirman con un updated_at algo anterior a la marca
+RADAR_MARGEN = datetime.timedelta(seconds=5)
+
+class RadarIncremental:
+    # Foto del radar compartida por todas las sesiones. Tras la carga inicial sólo se
+    # piden las filas de v_radar_hoy con `actualizado` posterior a la última marca,
+    # así que cada refresco transfiere los reportes nuevos y no la cohorte entera.
+    # La foto se respalda en disco: tras un reinicio el delta parte de la marca guardada.
+    CLAVE_DISCO = ("radar",)
+
+    def __init__(self):
+        self.fecha = None
+        self.marca = None
+        self.filas = {}
+        self.orden = []
+        self.filas_ultimo_refresco = 0
+        self.sincronizado = None
+        self._lock = threading.Lock()
+        self._refresco = threading.Lock()
+
+    def _restaurar(self, fecha):
+        respaldo = cache_disco.leer_instantanea(self.CLAVE_DISCO)
+        if respaldo is None or respaldo[0]["fecha"] != fecha: return
+        self.marca, self.sincronizado = respaldo[0]["marca"], respaldo[1]
+        self.filas = {f["id_paciente"]: f for f in respaldo[0]["filas"]}
+        self.orden = sorted(self.filas)
+
+    def refrescar(self, cliente, fecha):
+        # El delta se pide fuera de _lock: mientras llega, todas() y pagina() siguen
+        # sirviendo la foto anterior. _refresco evita dos deltas simultáneos.
+        with self._refresco:
+            with self._lock:
+                if fecha != self.fecha:
+                    self.fecha, self.marca, self.filas, self.orden, self.sincronizado = fecha, None, {}, [], None
+                    self._restaurar(fecha)
+                marca = self.marca
+            desde = (datetime.datetime.fromisoformat(marca) - RADAR_MARGEN).isoformat() if marca else None
+            paginas = list(iterar_keyset(cliente, "v_radar_hoy", COLUMNAS_RADAR + ", actualizado", ("id_paciente",), RADAR_TAM_PAGINA,
+                                         desde={"actualizado": desde} if desde else None))
+            recibidas, foto = sum(len(p) for p in paginas), None
+            with self._lock:
+                nuevos = False
+                for pagina in paginas:
+                    nuevos = nuevos or any(f["id_paciente"] not in self.filas for f in pagina)
+                    self.filas.update((f["id_paciente"], f) for f in pagina)
+                    self.marca = max([self.marca or ""] + [f["actualizado"] for f in pagina if f.get("actualizado")]) or None
+                if nuevos: self.orden = sorted(self.filas)
+                self.filas_ultimo_refresco = recibidas
+                self.sincronizado = time.time()
+                if recibidas: foto = {"fecha": fecha, "marca": self.marca, "filas": list(self.filas.values())}
+            if foto: cache_disco.guardar_instantanea(self.CLAVE_DISCO, "radar", (), foto, self.sincronizado)
+            return recibidas
+
+    def todas(self):
+        with self._lock: return [self.filas[i] for i in self.orden]
+
+    def pagina(self, pagina, tam_pagina):
+        with self._lock: return [self.filas[i] for i in self.orden[pagina * tam_pagina:(pagina + 1) * tam_pagina]], len(self.orden)
+
+radar = RadarIncremental()
+
+def leer_radar(cliente, fecha, pagina=0, tam_pagina=RADAR_TAM_PAGINA, ttl=RADAR_TTL):
+    # Devuelve (filas de la página, total de pacientes). El refresco incremental se
+    # comparte por TTL y cualquier escritura en pacientes/registros_diarios lo adelanta.
+    # Sin backend se sirve la última foto (en memoria o en disco) si la hay.
+    try: cache.obtener(("v_radar_hoy", "delta", (), fecha), lambda: radar.refrescar(cliente, fecha), ttl=ttl, persistir=False)
+    except Exception as e:
+        if not (es_error_de_red(e) and radar.filas): raise
+        estado.caida(e)
+    return radar.pagina(pagina, tam_pagina)
+
+def calentar(cliente, fecha):
+    # Al arrancar el proceso: foto del radar desde disco y delta contra el backend en
+    # segundo plano, para que el primer clínico no pague la carga completa
+    return _pool_fondo.submit(leer_radar, cliente, fecha)
+
+COLUMNAS_HISTORIAL = "fecha, fatiga_bfi, dolor_maximo, eficiencia_sueno, kilos_ejercicio_1, rpe_sesion, estado_animo, calidad_sueno, exposicion_sol_min"
+
+def leer_historial(cliente, id_paciente):
+    return leer(cliente, "registros_diarios", COLUMNAS_HISTORIAL, filtros={"id_paciente": id_paciente}, orden="fecha")
+
+def historial_al(id_paciente):
+    # Epoch de la foto del historial que se está mostrando (ver CacheLecturas.datos_al)
+    return cache.datos_al(_clave("registros_diarios", COLUMNAS_HISTORIAL, {"id_paciente": id_paciente}, "fecha"))
+
+# --- RECORRIDOS MASIVOS (paginación por clave, sin OFFSET) ---
+def _condicion_keyset(claves, ultimo):
+    # (a, b) > (x, y)  ->  a.gt.x,and(a.eq.x,b.gt.y)
+    partes = []
+    for i, clave in enumerate(claves):
+        iguales = [f"{c}.eq.{v}" for c, v in zip(claves[:i], ultimo[:i])]
+        mayor = f"{clave}.gt.{ultimo[i]}"
+        partes.append(f"and({','.join(iguales + [mayor])})" if iguales else mayor)
+    return ",".join(partes)
+
+# PostgREST (db-max-rows de Supabase) corta cada respuesta en 1000 filas aunque se
+# pida más: una página más grande volvería recortada y parecería la última.
+MAX_FILAS_SERVIDOR = 1000
+
+def iterar_keyset(cliente, tabla, columnas, claves=("id",), tam_pagina=1000, desde=None, en=None):
+    # Genera páginas de filas ordenadas por `claves`; `desde` = {columna: valor} aplica >=
+    # y `en` = {columna: [valores]} aplica IN
+    tam_pagina = min(tam_pagina, MAX_FILAS_SERVIDOR)
+    ultimo = None
+    while True:
+        consulta = cliente.table(tabla).select(columnas)
+        for col, valor in (desde or {}).items(): consulta = consulta.gte(col, valor)
+        for col, valores in (en or {}).items(): consulta = consulta.in_(col, valores)
+        if ultimo is not None: consulta = consulta.or_(_condicion_keyset(claves, ultimo))
+        for clave in claves: consulta = consulta.order(clave)
+        filas = _ejecutar(consulta.limit(tam_pagina), tabla, "select", {"keyset": claves, "desde": desde, "pagina": tam_pagina}).data
+        if not filas: return
+        yield filas
+        if len(filas) < tam_pagina: return
+        ultimo = tuple(filas[-1][c] for c in claves)
+
+# --- LECTURAS CONCURRENTES ---
+# Las lecturas independientes de una misma pantalla se lanzan a la vez: la latencia
+# pasa a ser la de la consulta más lenta y no la suma de todas. Una lectura que vence
+# el plazo sigue corriendo en segundo plano y, al terminar, deja su resultado en caché.
+# Lo que ya está en memoria se sirve en el hilo del rerun sin pasar por el pool: con
+# lecturas colgadas ocupando los hilos, un dato en caché no debe esperar turno. Los
+# refrescos stale-while-revalidate y el calentamiento van a un pool propio.
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dtx-lectura")
+_pool_fondo = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dtx-revalidacion")
+MAX_REVALIDACIONES = 32
+MAX_COLGADAS = 4   # lecturas vencidas que pueden seguir ocupando hilos de _pool
+_colgadas = set()
+_lock_colgadas = threading.Lock()
+_sonda = threading.local()
+
+class _FueraDeMemoria(BaseException):
+    # Corta la pasada en memoria de leer_en_paralelo en cuanto una lectura necesita el
+    # backend. BaseException: un `except Exception` de la lectura no debe tragárselo.
+    pass
+
+def _en_memoria(tarea):
+    # (True, resultado) si la tarea se resolvió sin tocar el backend; (False, None) si no
+    _sonda.activa = True
+    try: return True, tarea()
+    except _FueraDeMemoria: return False, None
+    finally: _sonda.activa = False
+
+def _soltar_colgada(futuro):
+    with _lock_colgadas: _colgadas.discard(futuro)
+
+def leer_en_paralelo(tareas, timeout=8.0):
+    # tareas: {nombre: función de lectura sin argumentos}. Devuelve (resultados, errores)
+    # por nombre. Cada tarea puede correr dos veces (pasada en memoria y en el pool):
+    # sólo lecturas, sin efectos antes de consultar.
+    resultados, errores, futuros = {}, {}, {}
+    for nombre, tarea in tareas.items():
+        try: en_memoria, resultado = _en_memoria(tarea)
+        except Exception as e: errores[nombre] = e; continue
+        if en_memoria: resultados[nombre] = resultado; continue
+        with _lock_colgadas: saturado = len(_colgadas) >= MAX_COLGADAS
+        # Con los hilos tomados por lecturas colgadas, encolar más sólo alarga la espera
+        if saturado: errores[nombre] = TimeoutError(f"backend saturado: {MAX_COLGADAS} lecturas sin respuesta"); continue
+        futuros[nombre] = _pool.submit(tarea)
+    hechos, pendientes = wait(futuros.values(), timeout=timeout)
+    for futuro in pendientes:
+        with _lock_colgadas: _colgadas.add(futuro)
+        futuro.add_done_callback(_soltar_colgada)
+    for nombre, futuro in futuros.items():
+        if futuro not in hechos: errores[nombre] = TimeoutError(f"sin respuesta en {timeout:.0f} s"); continue
+        try: resultados[nombre] = futuro.result()
+        except Exception as e: errores[nombre] = e
+    return resultados, errores
+
+def buscar_paciente(cliente, id_paciente):
+    # Login: siempre contra el backend (sin caché) para no validar PINs viejos
+    res = _ejecutar(cliente.table("pacientes").select("*").eq("id_paciente", id_paciente), "pacientes", "select", {"id_paciente": id_paciente})
+    return res.data[0] if res.data else None
+
+# --- ESCRITURAS (invalidan sólo las claves afectadas) ---
+# Si el backend no responde, la escritura queda en la cola persistente de
+# cache_disco y la función devuelve None; drenar_cola() la envía más tarde.
+# Los lotes (scripts de línea de comandos) no se encolan: sin red, fallan.
+def _consulta_escritura(cliente, tabla, operacion, valores, filtros=None, on_conflict=None):
+    if operacion == "insert": return cliente.table(tabla).insert(valores)
+    if operacion == "upsert": return cliente.table(tabla).upsert(valores, on_conflict=on_conflict)
+    consulta = cliente.table(tabla).update(valores)
+    for col, valor in (filtros or {}).items(): consulta = consulta.eq(col, valor)
+    return consulta
+
+def _clave_cola(tabla, operacion, fila, filtros=None, on_conflict=None):
+    # Dos escrituras pendientes sobre la misma fila se fusionan en una sola
+    if operacion == "update": return (tabla, operacion, sorted(filtros.items()))
+    if operacion == "upsert": return (tabla, operacion, [fila.get(c.strip()) for c in on_conflict.split(",")])
+    return None
+
+def _escribir(cliente, tabla, operacion, valores, filtros=None, on_conflict=None, etiqueta=None, encolar=True):
+    filas = valores if isinstance(valores, list) else [valores]
+    try: res = _ejecutar(_consulta_escritura(cliente, tabla, operacion, valores, filtros, on_conflict), tabla, operacion, etiqueta or filtros)
+    except Exception as e:
+        if not (encolar and es_error_de_red(e)): raise
+        estado.caida(e)
+        for fila in filas:
+            cache_disco.encolar(tabla, operacion, fila, filtros, on_conflict, _clave_cola(tabla, operacion, fila, filtros, on_conflict))
+        return None
+    # Lo que quedó en cola sobre las mismas filas es anterior a esta escritura: al
+    # drenarse no debe pisarla (p.ej. un triage offline reenviado después online)
+    if operacion != "insert": cache_disco.superar([(_clave_cola(tabla, operacion, fila, filtros, on_conflict), fila) for fila in filas])
+    return res
+
+def insertar(cliente, tabla, fila):
+    res = _escribir(cliente, tabla, "insert", fila)
+    if res is None: return None
+    cache.invalidar(tabla, fila)
+    return res.data
+
+def guardar_triage(cliente, fila):
+    # Un solo viaje de red: INSERT ... ON CONFLICT (id_paciente, fecha) DO UPDATE.
+    # Requiere la restricción única de sql/001_registros_unicos.sql.
+    res = _escribir(cliente, "registros_diarios", "upsert", fila, on_conflict="id_paciente,fecha", etiqueta={"id_paciente": fila.get("id_paciente"), "fecha": fila.get("fecha")})
+    if res is None: return None
+    cache.invalidar("registros_diarios", fila)
+    return res.data[0] if res.data else fila
+
+def guardar_lote(cliente, tabla, filas, on_conflict):
+    # Quien lanza un lote necesita saber si se escribió: un fallo de red se propaga.
+    # Una sola invalidación por tabla (cada una recorre las fotos en disco).
+    res = _escribir(cliente, tabla, "upsert", filas, on_conflict=on_conflict, etiqueta={"lote": len(filas)}, encolar=False)
+    cache.invalidar(tabla)
+    return res.data
+
+def guardar_lote_registros(cliente, filas):
+    return guardar_lote(cliente, "registros_diarios", filas, "id_paciente,fecha")
+
+def borrar(cliente, tabla, en, mayor=None):
+    # DELETE con `en` = {columna: [valores]} (IN) y `mayor` = {columna: valor} (>). Sólo
+    # lo usan scripts en lote: sin red falla, no se encola.
+    consulta = cliente.table(tabla).delete()
+    for col, valores in en.items(): consulta = consulta.in_(col, valores)
+    for col, valor in (mayor or {}).items(): consulta = consulta.gt(col, valor)
+    res = _ejecutar(consulta, tabla, "delete", {"en": {c: len(v) for c, v in en.items()}, "mayor": mayor})
+    cache.invalidar(tabla)
+    return res.data
+
+def actualizar(cliente, tabla, valores, filtros):
+    res = _escribir(cliente, tabla, "update", valores, filtros)
+    if res is None: return None
+    # Las filas devueltas identifican exactamente qué se tocó (p.ej. update por "id")
+    for fila in res.data or [{}]: cache.invalidar(tabla, {**filtros, **fila}, tuple(valores))
+    return res.data
+
+# --- COLA DE ESCRITURAS PENDIENTES ---
+escrituras_pendientes = cache_disco.tamano_cola
+INTERVALO_DRENAJE = 10.0
+_drenaje = threading.Lock()
+_ultimo_drenaje = 0.0
+
+def drenar_cola(cliente, forzar=False):
+    # Reenvía en orden las escrituras encoladas sin red. Se corta en el primer fallo de
+    # red; un rechazo del servidor cuenta un intento y pasa a la siguiente. Devuelve
+    # cuántas se enviaron.
+    global _ultimo_drenaje
+    if not forzar and time.monotonic() - _ultimo_drenaje < INTERVALO_DRENAJE: return 0
+    if not _drenaje.acquire(blocking=False): return 0
+    try:
+        _ultimo_drenaje = time.monotonic()
+        enviadas = 0
+        for pendiente in cache_disco.pendientes():
+            # Se relee justo antes de enviar: una escritura directa pudo superarla mientras tanto
+            fila = cache_disco.pendiente(pendiente["clave"])
+            if fila is None: continue
+            tabla, operacion, filtros = pendiente["tabla"], pendiente["operacion"], pendiente["filtros"]
+            try: _ejecutar(_consulta_escritura(cliente, tabla, operacion, fila, filtros, pendiente["on_conflict"]), tabla, operacion, {"cola": pendiente["intentos"]})
+            except Exception as e:
+                if es_error_de_red(e): estado.caida(e); break
+                if cache_disco.registrar_fallo(pendiente["clave"], e): _log.warning("Escritura descartada tras %s intentos: %s %s %s (%s)", cache_disco.MAX_INTENTOS, operacion, tabla, fila, e)
+                continue
+            cache_disco.quitar(pendiente["clave"])
+            cache.invalidar(tabla, {**(filtros or {}), **fila}, tuple(fila) if operacion == "update" else ())
+            enviadas += 1
+        if enviadas: estado.en_linea()
+        return enviadas
+    finally: _drenaje.release()
+
+# --- CLIENTE FUERA DE STREAMLIT (scripts de línea de comandos) ---
+def cliente_desde_secretos(ruta=".streamlit/secrets.toml"):
+    import tomllib
+    from supabase import create_client
+    secretos = {}
+    if os.path.exists(ruta):
+        with open(ruta, "rb") as f: secretos = tomllib.load(f)
+    url = os.environ.get("SUPABASE_URL", secretos.get("SUPABASE_URL"))
+    clave = os.environ.get("SUPABASE_KEY", secretos.get("SUPABASE_KEY"))
+    if not url or not clave: raise RuntimeError(f"Faltan SUPABASE_URL / SUPABASE_KEY (variables de entorno o {ruta}).")
+    return usar_backend(create_client(url, clave))
+
+def usar_backend(cliente):
+    # Las fotos y la cola en disco del proceso pasan a ser las de este backend (su URL)
+    cache_disco.origen = str(getattr(cliente, "supabase_url", "") or "").rstrip("/")
+    return cliente
+
+class ClienteSinConexion:
+    # Sustituto cuando no se pudo crear el cliente: cada consulta falla como fallo de
+    # red, así las lecturas caen a las fotos en disco y las escrituras a la cola
+    def __init__(self, error, supabase_url=None): self.error, self.supabase_url = error, supabase_url
+    def table(self, tabla): raise ConnectionError(f"Sin cliente de backend: {self.error}")
@@ -0,0 +1,149 @@
+import argparse
+import time
+
+from reglas import AMARILLO, ROJO, VERDE
+
+# =====================================================================
+# 🧱 ESQUEMA TIPADO DE LOS DATAFRAMES DE REGISTROS
+# =====================================================================
+# res.data llega como texto y float64: ánimo, sueño y semáforo son strings
+# repetidos, zonas_dolor una lista unida por comas y los puntajes 0-10 ocupan 8
+# bytes. tipar() deja cada columna en su tipo compacto (categóricas ordenadas,
+# enteros chicos con nulos, float32, fecha datetime y zonas como máscara de bits)
+# y lo usan el radar, los gráficos del histórico y las alertas. Los tipos compactos
+# son sólo de memoria: el Parquet de exportar.py toma de aquí únicamente el diccionario.
+# pandas se importa dentro de las funciones: el envío del triage no lo carga.
+# Benchmark:  python esquema.py [--filas 1000000]
+
+ANIMOS = ["Muy mal", "Mal", "Regular", "Bien", "Muy Bien", "Excelente"]
+CALIDADES_SUENO = ["Malo", "Regular", "Bueno", "Reparador"]
+ZONAS_DOLOR = ["Hombro Izq", "Hombro Der", "Lumbar", "Rodillas", "Neuropatía"]
+
+# Categorías conocidas; un valor fuera de la lista (p.ej. '⚪' o 'S/D' de v_radar_hoy)
+# se agrega al final en vez de perderse como nulo
+CATEGORIAS = {
+    "estado_animo": ANIMOS, "calidad_sueno": CALIDADES_SUENO, "semaforo": [VERDE, AMARILLO, ROJO],
+    "estado_triage": ["Pendiente", "Completado"], "estado_sesion": ["Completado", "Vagal Completado", "Revisado (Control)"],
+    "id_paciente": [], "grupo": ["EXPERIMENTAL", "CONTROL"], "cohorte": ["MAMA", "PROSTATA"], "version_reglas": [],
+    "ejercicio_1": [], "ejercicio_2": [], "ejercicio_3": [], "ejercicio_4": [],
+}
+ORDENADAS = ("estado_animo", "calidad_sueno", "semaforo")
+ENTEROS = {"fatiga_bfi": "Int8", "estres_nccn": "Int8", "dolor_maximo": "Int8", "rpe_sesion": "Int8", "despertares_veces": "Int8",
+           "latencia_min": "Int16", "exposicion_sol_min": "Int16"}
+REALES = {"eficiencia_sueno": "float32", **{f"kilos_ejercicio_{k}": "float32" for k in range(1, 5)}}
+FECHAS = ("fecha", "fecha_inicio")
+
+# --- Máscara de zonas de dolor (bit i = ZONAS_DOLOR[i]) ---
+def mascara_zonas(texto):
+    if not isinstance(texto, str): return 0
+    partes = {p.strip() for p in texto.split(",")}
+    return sum(1 << i for i, z in enumerate(ZONAS_DOLOR) if z in partes)
+
+def zonas(mascara):
+    return ", ".join(z for i, z in enumerate(ZONAS_DOLOR) if int(mascara) & (1 << i)) or "Ninguna"
+
+def con_zona(serie, zona):
+    # Filtro vectorizado: filas con dolor en `zona`
+    return (serie & (1 << ZONAS_DOLOR.index(zona))) != 0
+
+def _codificar_zonas(serie):
+    import numpy as np
+    import pandas as pd
+    # Pocas combinaciones distintas: se codifica cada una una vez y se expande
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    return pd.Series(np.array([mascara_zonas(u) for u in unicos], dtype="uint8")[codigos], index=serie.index, name=serie.name)
+
+# --- Conversión ---
+def _categorica(serie, categorias, ordenada):
+    # astype + set_categories recodifica sólo la lista de categorías, no las filas
+    serie = serie.astype("category")
+    extra = sorted(set(serie.cat.categories) - set(categorias), key=str)
+    return serie.cat.set_categories(list(categorias) + extra, ordered=ordenada)
+
+def tipar(df):
+    # Devuelve un DataFrame nuevo con los tipos compactos; las columnas que no están
+    # en el esquema (id, actualizado, ...) pasan sin cambios
+    import pandas as pd
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if col in CATEGORIAS: df[col] = _categorica(df[col], CATEGORIAS[col], col in ORDENADAS)
+        elif col in ENTEROS: df[col] = pd.to_numeric(df[col], errors="coerce").round().astype(ENTEROS[col])
+        elif col in REALES: df[col] = pd.to_numeric(df[col], errors="coerce").astype(REALES[col])
+        elif col in FECHAS: df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601")
+        elif col == "zonas_dolor": df[col] = _codificar_zonas(df[col])
+    return df
+
+def puntaje(serie):
+    # Posición 1..n en la escala ordenada (0 si falta o no es de la escala), en int8
+    import numpy as np
+    codigos = serie.cat.codes.to_numpy()
+    return np.where((codigos >= 0) & (codigos < len(CATEGORIAS[serie.name])), codigos + 1, 0).astype("int8")
+
+def tipo_arrow(col):
+    # Codificación de diccionario para las categóricas en el Parquet (exportar.py)
+    import pyarrow as pa
+    return pa.dictionary(pa.int32(), pa.string()) if col in CATEGORIAS else None
+
+# --- Benchmark ---
+def _sintetico(filas, pacientes, semilla=0):
+    # Mismo formato que res.data: listas de Python con strings, None y float
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(semilla)
+    ids = np.array([f"P{i:05d}" for i in range(pacientes)])
+    dias = pd.date_range("2022-01-01", periods=-(-filas // pacientes)).strftime("%Y-%m-%d").to_numpy()
+    i_pac, i_dia = np.arange(filas) % pacientes, np.arange(filas) // pacientes
+    sesion = rng.random(filas) < 3 / 7
+    combos = ["Ninguna"] * 6 + ["Lumbar", "Hombro Izq", "Rodillas, Lumbar", "Hombro Der, Neuropatía", "Neuropatía"]
+    kilos = lambda: np.where(sesion, rng.choice([10.0, 15.0, 20.0, 25.0], filas), np.nan)
+    nulo = lambda a: [None if v != v else v for v in a.tolist()]
+    return pd.DataFrame({
+        "id_paciente": ids[i_pac].tolist(), "fecha": dias[i_dia].tolist(), "estado_triage": ["Completado"] * filas,
+        "semaforo": rng.choice([VERDE, VERDE, VERDE, AMARILLO, ROJO], filas).tolist(), "version_reglas": ["v1"] * filas,
+        "eficiencia_sueno": np.round(rng.uniform(60, 99, filas), 1).tolist(), "latencia_min": rng.choice([5, 15, 30, 60], filas).tolist(),
+        "despertares_veces": rng.integers(0, 5, filas).tolist(), "calidad_sueno": rng.choice(CALIDADES_SUENO, filas).tolist(),
+        "estado_animo": rng.choice(ANIMOS, filas).tolist(), "exposicion_sol_min": rng.choice([0, 15, 30, 60], filas).tolist(),
+        "fatiga_bfi": rng.integers(0, 11, filas).astype(float).tolist(), "estres_nccn": rng.integers(0, 11, filas).astype(float).tolist(),
+        "dolor_maximo": rng.integers(0, 11, filas).astype(float).tolist(), "zonas_dolor": rng.choice(combos, filas).tolist(),
+        "estado_sesion": np.where(sesion, "Completado", None).tolist(), "rpe_sesion": nulo(np.where(sesion, rng.integers(4, 9, filas), np.nan)),
+        **{f"kilos_ejercicio_{k}": nulo(kilos()) for k in range(1, 5)},
+    }), pd.DataFrame({"id_paciente": ids.tolist(), "cohorte": rng.choice(["MAMA", "PROSTATA"], pacientes).tolist(),
+                      "grupo": rng.choice(["EXPERIMENTAL", "CONTROL"], pacientes).tolist()})
+
+def _mejor_de(funcion, repeticiones=3):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter(); funcion(); tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos) * 1000
+
+def benchmark(filas=1_000_000, pacientes=2000):
+    import pandas as pd
+    inicio = time.perf_counter()
+    crudo, roster = _sintetico(filas, pacientes)
+    print(f"🧪 {filas:,} registros sintéticos de {pacientes:,} pacientes ({time.perf_counter() - inicio:.1f} s)")
+    inicio = time.perf_counter()
+    tipado, roster_tipado = tipar(crudo), tipar(roster)
+    print(f"🧱 tipar(): {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    corte_txt = crudo["fecha"].iloc[max(0, len(crudo) - 1 - pacientes * 90)]
+    corte = pd.Timestamp(corte_txt)
+    # Filtro típico del análisis: rojos con dolor lumbar en los últimos 90 días
+    filtro_antes = lambda: crudo[(crudo["semaforo"] == ROJO) & (crudo["fecha"] >= corte_txt) & crudo["zonas_dolor"].str.contains("Lumbar", regex=False)]
+    filtro_despues = lambda: tipado[(tipado["semaforo"] == ROJO) & (tipado["fecha"] >= corte) & con_zona(tipado["zonas_dolor"], "Lumbar")]
+    assert len(filtro_antes()) == len(filtro_despues())
+    filas_tabla = [
+        ("memoria (MB)", crudo.memory_usage(deep=True).sum() / 1e6, tipado.memory_usage(deep=True).sum() / 1e6),
+        ("filtro (ms)", _mejor_de(filtro_antes), _mejor_de(filtro_despues)),
+        ("merge con pacientes (ms)", _mejor_de(lambda: crudo.merge(roster, on="id_paciente")), _mejor_de(lambda: tipado.merge(roster_tipado, on="id_paciente"))),
+        ("fatiga media por brazo y semáforo (ms)",
+         _mejor_de(lambda: crudo.merge(roster, on="id_paciente").groupby(["grupo", "semaforo"])["fatiga_bfi"].mean()),
+         _mejor_de(lambda: tipado.merge(roster_tipado, on="id_paciente").groupby(["grupo", "semaforo"], observed=True)["fatiga_bfi"].mean())),
+    ]
+    print(f"{'':40} {'antes':>10} {'después':>10} {'factor':>8}")
+    for nombre, antes, despues in filas_tabla: print(f"{nombre:40} {antes:10.1f} {despues:10.1f} {antes / despues:7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memoria y tiempos de filtro/merge: DataFrame crudo vs tipado.")
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--pacientes", type=int, default=2000)
+    args = parser.parse_args()
+    benchmark(args.filas, args.pacientes)
@@ -0,0 +1,96 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+
+import datos
+import esquema
+
+# =====================================================================
+# 📦 EXPORTACIÓN DEL ENSAYO (CSV / PARQUET EN STREAMING)
+# =====================================================================
+# Recorre v_registros_export (sql/004_exportacion.sql) en páginas por (fecha, id)
+# y escribe cada página apenas llega: la memoria no crece con el tamaño del ensayo.
+# La marca incremental es el inicio de la exportación menos MARGEN_MARCA, no el mayor
+# `actualizado` visto: una fila que cambia detrás del cursor o que confirma con un
+# now() algo anterior entra en la próxima corrida. Las corridas se solapan, así que
+# quien acumula los archivos se queda, por `id`, con la fila de mayor `actualizado`.
+# Uso:  python exportar.py --formato parquet --salida registros.parquet [--incremental]
+
+COLUMNAS_EXPORT = [
+    "id", "id_paciente", "cohorte", "grupo", "fecha_inicio", "fecha", "estado_triage", "semaforo", "version_reglas",
+    "eficiencia_sueno", "latencia_min", "despertares_veces", "calidad_sueno", "estado_animo", "exposicion_sol_min",
+    "fatiga_bfi", "estres_nccn", "dolor_maximo", "zonas_dolor", "estado_sesion", "protocolo_vagal", "rpe_sesion",
+    "ejercicio_1", "kilos_ejercicio_1", "ejercicio_2", "kilos_ejercicio_2", "ejercicio_3", "kilos_ejercicio_3", "ejercicio_4", "kilos_ejercicio_4",
+    "actualizado",
+]
+RUTA_MARCA = ".exportacion_marca.json"
+MARGEN_MARCA = datetime.timedelta(minutes=5)  # transacciones largas y reloj del servidor vs el local
+
+def _esquema_parquet():
+    # Archivo de archivo: los numéricos siguen en float64 (sin pérdida y concatenables
+    # con volcados anteriores); sólo las categóricas de esquema.py van como diccionario
+    import pyarrow as pa
+    tipos = {"id": pa.int64(), "fecha_inicio": pa.date32(), "fecha": pa.date32(), "protocolo_vagal": pa.bool_(), "actualizado": pa.string()}
+    for c in ["eficiencia_sueno", "latencia_min", "despertares_veces", "exposicion_sol_min", "fatiga_bfi", "estres_nccn", "dolor_maximo", "rpe_sesion",
+              "kilos_ejercicio_1", "kilos_ejercicio_2", "kilos_ejercicio_3", "kilos_ejercicio_4"]: tipos[c] = pa.float64()
+    return pa.schema([(c, tipos.get(c) or esquema.tipo_arrow(c) or pa.string()) for c in COLUMNAS_EXPORT])
+
+class _EscritorCSV:
+    def __init__(self, ruta):
+        self._f = open(ruta, "w", newline="", encoding="utf-8")
+        self._w = csv.DictWriter(self._f, fieldnames=COLUMNAS_EXPORT, extrasaction="ignore")
+        self._w.writeheader()
+    def escribir(self, filas): self._w.writerows(filas)
+    def cerrar(self): self._f.close()
+
+class _EscritorParquet:
+    def __init__(self, ruta):
+        import pyarrow.parquet as pq
+        self._esquema = _esquema_parquet()
+        self._w = pq.ParquetWriter(ruta, self._esquema, compression="zstd")
+    def escribir(self, filas):
+        import pyarrow as pa
+        columnas = {c: [_convertir(f.get(c), self._esquema.field(c).type) for f in filas] for c in COLUMNAS_EXPORT}
+        self._w.write_table(pa.table(columnas, schema=self._esquema))
+    def cerrar(self): self._w.close()
+
+def _convertir(valor, tipo):
+    import pyarrow as pa
+    if valor is None: return None
+    if pa.types.is_date32(tipo): return datetime.date.fromisoformat(str(valor)[:10])
+    return valor
+
+def leer_marca(ruta=RUTA_MARCA):
+    if not os.path.exists(ruta): return None
+    with open(ruta, encoding="utf-8") as f: return json.load(f).get("actualizado")
+
+def guardar_marca(marca, ruta=RUTA_MARCA):
+    with open(ruta, "w", encoding="utf-8") as f: json.dump({"actualizado": marca, "exportado_el": datetime.datetime.now(datetime.timezone.utc).isoformat()}, f)
+
+def exportar(cliente, salida, formato="csv", desde=None, tam_pagina=datos.MAX_FILAS_SERVIDOR):
+    # Devuelve (filas escritas, marca para la próxima corrida incremental)
+    marca = (datetime.datetime.now(datetime.timezone.utc) - MARGEN_MARCA).isoformat()
+    escritor = _EscritorParquet(salida) if formato == "parquet" else _EscritorCSV(salida)
+    total = 0
+    try:
+        for filas in datos.iterar_keyset(cliente, "v_registros_export", ", ".join(COLUMNAS_EXPORT), ("fecha", "id"), tam_pagina,
+                                         desde={"actualizado": desde} if desde else None):
+            escritor.escribir(filas)
+            total += len(filas)
+    finally: escritor.cerrar()
+    return total, marca
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta registros_diarios + pacientes (Tidy Data).")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--salida", help="Archivo de destino (por defecto registros_<fecha>.<formato>)")
+    parser.add_argument("--incremental", action="store_true", help="Sólo filas nuevas o modificadas desde la última exportación (se solapa con ella: deduplicar por id)")
+    parser.add_argument("--tam-pagina", type=int, default=datos.MAX_FILAS_SERVIDOR, help=f"Filas por página (máximo {datos.MAX_FILAS_SERVIDOR}, tope del servidor)")
+    args = parser.parse_args()
+    salida = args.salida or f"registros_{datetime.date.today():%Y%m%d}.{args.formato}"
+    desde = leer_marca() if args.incremental else None
+    total, marca = exportar(datos.cliente_desde_secretos(), salida, args.formato, desde, args.tam_pagina)
+    guardar_marca(marca)
+    print(f"{total} filas exportadas a {salida}" + (f" (desde {desde})" if desde else ""))
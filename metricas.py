@@ -0,0 +1,184 @@
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+# =====================================================================
+# ⏱️ MÉTRICAS DE EJECUCIÓN (PROCESO COMPLETO, TODAS LAS SESIONES)
+# =====================================================================
+# - Reruns completos vs. reruns de fragmento (st.fragment) y su CPU, por rol: la del
+#   paciente por reporte enviado y la del investigador aparte.
+# - Cada llamada al backend (tabla, operación, filtros, latencia, filas, bytes, éxito).
+# - Fases de render (login, triage, radar, historial, sesion).
+# Todo se escribe en un log JSON rotativo y en instantáneas JSON / Prometheus
+# (logs/metricas.json y logs/metricas.prom) que un recolector local puede leer.
+
+DIR_METRICAS = os.environ.get("DTX_DIR_METRICAS", "logs")
+INTERVALO_INSTANTANEA = 15
+VENTANA = 1000
+
+_lock = threading.Lock()
+_hilo = threading.local()
+reruns = {"completo": 0, "fragmento": 0}
+cpu_seg = {"completo": 0.0, "fragmento": 0.0}
+ROLES = {"Paciente": "paciente", "Investigador": "investigador", None: "sin_sesion"}
+cpu_rol = dict.fromkeys(ROLES.values(), 0.0)
+reportes_completados = 0
+
+def _registrar(tipo, segundos, rol):
+    with _lock:
+        reruns[tipo] += 1
+        cpu_seg[tipo] += segundos
+        cpu_rol[ROLES.get(rol, "sin_sesion")] += segundos
+
+def inicio_rerun(rol=None):
+    # rol: st.session_state.role al empezar (None en la pantalla de login). Un rerun
+    # cortado por st.stop(), st.rerun() o una excepción no llegó a fin_rerun(): se
+    # cierra aquí, al empezar el siguiente en el mismo hilo.
+    if getattr(_hilo, "completo", False): fin_rerun()
+    _hilo.completo, _hilo.rol = True, rol
+    _hilo.inicio = time.thread_time()
+
+def fin_rerun():
+    _cerrar_fase()
+    if getattr(_hilo, "completo", False): _registrar("completo", time.thread_time() - _hilo.inicio, _hilo.rol)
+    _hilo.completo = False
+    escribir_instantanea()
+
+def _solo_fragmento():
+    # Streamlit anota en el contexto del script qué fragmentos corre este rerun; en un
+    # rerun completo la lista está vacía. Fuera de Streamlit decide el estado del hilo.
+    try: from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError: get_script_run_ctx = None
+    ctx = get_script_run_ctx(suppress_warning=True) if get_script_run_ctx else None
+    if ctx is None: return not getattr(_hilo, "completo", False)
+    return bool(ctx.fragment_ids_this_run)
+
+def medir_fragmento(rol):
+    # Dentro de un rerun completo el costo ya se cuenta en "completo"
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _solo_fragmento(): return funcion(*args, **kwargs)
+            inicio = time.thread_time()
+            try: return funcion(*args, **kwargs)
+            finally: _registrar("fragmento", time.thread_time() - inicio, rol)
+        return envoltura
+    return decorador
+
+def registrar_reporte():
+    global reportes_completados
+    with _lock: reportes_completados += 1
+
+# --- Llamadas al backend y fases de render ---
+_latencias = defaultdict(lambda: deque(maxlen=VENTANA))
+_contadores = defaultdict(lambda: {"llamadas": 0, "errores": 0, "filas": 0, "bytes": 0})
+_fases = defaultdict(lambda: deque(maxlen=VENTANA))
+_ultima_instantanea = 0.0
+
+def _logger():
+    log = logging.getLogger("dtx.metricas")
+    if not log.handlers:
+        os.makedirs(DIR_METRICAS, exist_ok=True)
+        manejador = logging.handlers.RotatingFileHandler(os.path.join(DIR_METRICAS, "metricas.log"), maxBytes=5_000_000, backupCount=5, encoding="utf-8")
+        manejador.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(manejador); log.setLevel(logging.INFO); log.propagate = False
+    return log
+
+def _escribir_log(evento):
+    try: _logger().info(json.dumps({"ts": time.time(), **evento}, ensure_ascii=False, default=str))
+    except OSError: pass
+
+class _Llamada:
+    def __init__(self): self.filas, self.bytes = 0, 0
+    def resultado(self, data):
+        self.filas = len(data) if isinstance(data, list) else int(data is not None)
+        self.bytes = len(json.dumps(data, default=str).encode("utf-8")) if data else 0
+
+@contextlib.contextmanager
+def llamada(tabla, operacion, filtros=None):
+    tipo = f"{tabla}.{operacion}"
+    reg, inicio, error = _Llamada(), time.perf_counter(), None
+    try: yield reg
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        with _lock:
+            _latencias[tipo].append(ms)
+            c = _contadores[tipo]
+            c["llamadas"] += 1; c["errores"] += error is not None; c["filas"] += reg.filas; c["bytes"] += reg.bytes
+        _escribir_log({"evento": "backend", "tabla": tabla, "operacion": operacion, "filtros": filtros, "ms": round(ms, 2),
+                       "filas": reg.filas, "bytes": reg.bytes, "ok": error is None, "error": str(error) if error else None})
+
+def marcar_fase(nombre):
+    # Cierra la fase anterior del rerun en curso y abre `nombre`
+    _cerrar_fase()
+    _hilo.fase, _hilo.inicio_fase = nombre, time.perf_counter()
+
+def _cerrar_fase():
+    nombre = getattr(_hilo, "fase", None)
+    if nombre is None: return
+    ms = (time.perf_counter() - _hilo.inicio_fase) * 1000
+    with _lock: _fases[nombre].append(ms)
+    _hilo.fase = None
+    _escribir_log({"evento": "fase", "fase": nombre, "ms": round(ms, 2)})
+
+def _percentil(valores, q):
+    if not valores: return None
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(q * (len(orden) - 1))))]
+
+def instantanea():
+    reruns_actuales = resumen_reruns()
+    with _lock:
+        backend = {t: {**_contadores[t], "p50_ms": _percentil(v, 0.5), "p95_ms": _percentil(v, 0.95)} for t, v in _latencias.items()}
+        fases = {f: {"n": len(v), "p50_ms": _percentil(v, 0.5), "p95_ms": _percentil(v, 0.95)} for f, v in _fases.items()}
+    return {"generado": time.time(), "backend": backend, "fases": fases, "reruns": reruns_actuales}
+
+def texto_prometheus(datos=None):
+    datos = datos or instantanea()
+    lineas = ["# TYPE dtx_backend_llamadas_total counter", "# TYPE dtx_backend_errores_total counter", "# TYPE dtx_backend_bytes_total counter",
+              "# TYPE dtx_backend_latencia_ms summary", "# TYPE dtx_fase_ms summary"]
+    for tipo, m in sorted(datos["backend"].items()):
+        tabla, op = tipo.rsplit(".", 1)
+        etiquetas = f'tabla="{tabla}",operacion="{op}"'
+        lineas += [f"dtx_backend_llamadas_total{{{etiquetas}}} {m['llamadas']}", f"dtx_backend_errores_total{{{etiquetas}}} {m['errores']}",
+                   f"dtx_backend_bytes_total{{{etiquetas}}} {m['bytes']}",
+                   f'dtx_backend_latencia_ms{{{etiquetas},quantile="0.5"}} {m["p50_ms"]:.3f}', f'dtx_backend_latencia_ms{{{etiquetas},quantile="0.95"}} {m["p95_ms"]:.3f}']
+    for fase, m in sorted(datos["fases"].items()):
+        lineas += [f'dtx_fase_ms{{fase="{fase}",quantile="0.5"}} {m["p50_ms"]:.3f}', f'dtx_fase_ms{{fase="{fase}",quantile="0.95"}} {m["p95_ms"]:.3f}']
+    r = datos["reruns"]
+    lineas += ["# TYPE dtx_reruns_total counter", f'dtx_reruns_total{{tipo="completo"}} {r["reruns_completo"]}', f'dtx_reruns_total{{tipo="fragmento"}} {r["reruns_fragmento"]}',
+               "# TYPE dtx_reportes_total counter", f"dtx_reportes_total {r['reportes']}", "# TYPE dtx_cpu_ms_total counter"]
+    lineas += [f'dtx_cpu_ms_total{{rol="{rol}"}} {r[f"cpu_ms_{rol}"]:.3f}' for rol in ROLES.values()]
+    return "\n".join(lineas) + "\n"
+
+def escribir_instantanea(forzar=False):
+    global _ultima_instantanea
+    ahora = time.monotonic()
+    if not forzar and ahora - _ultima_instantanea < INTERVALO_INSTANTANEA: return
+    _ultima_instantanea = ahora
+    datos = instantanea()
+    try:
+        os.makedirs(DIR_METRICAS, exist_ok=True)
+        # Escritura atómica: el recolector nunca lee un archivo a medias
+        for nombre, contenido in (("metricas.json", json.dumps(datos, ensure_ascii=False, default=str)), ("metricas.prom", texto_prometheus(datos))):
+            tmp = os.path.join(DIR_METRICAS, nombre + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f: f.write(contenido)
+            os.replace(tmp, os.path.join(DIR_METRICAS, nombre))
+    except OSError: pass
+
+def resumen_reruns():
+    with _lock:
+        total_cpu = cpu_seg["completo"] + cpu_seg["fragmento"]
+        # Por reporte sólo cuenta la ruta del paciente: los reruns del investigador no envían reportes
+        return {**{f"reruns_{k}": v for k, v in reruns.items()}, "cpu_total_ms": total_cpu * 1000, "reportes": reportes_completados,
+                **{f"cpu_ms_{rol}": seg * 1000 for rol, seg in cpu_rol.items()},
+                "cpu_ms_por_reporte": (cpu_rol["paciente"] * 1000 / reportes_completados) if reportes_completados else None}
@@ -0,0 +1,149 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+
+import backend_local
+
+# =====================================================================
+# 🏋️ PRUEBA DE CARGA: PICO MATUTINO DE TRIAGE + RADAR
+# =====================================================================
+# Simula pacientes que envían su triage e investigadores que navegan el radar,
+# en paralelo, a través de AppTest de Streamlit contra el backend local.
+# AppTest usa estado global de Streamlit y no admite varias sesiones por proceso:
+# cada worker es un proceso (como una réplica del servidor) y todos comparten un
+# único backend local servido por backend_local.servir().
+# Reporta rendimiento, latencias p50/p95 y llamadas al backend por acción.
+# Uso:  python prueba_carga.py --pacientes 200 --investigadores 20 --latencia 0.05
+#       [--max-p95-ms 1500 --max-llamadas-envio 2]   (sale con código 1 si se excede)
+
+RUTA_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+# Avisos de la app cuando una lectura o escritura no llegó al backend (cola offline,
+# foto vieja): para la prueba son errores aunque la pantalla siga funcionando
+AVISOS_DEGRADADOS = ("📴", "⏳")
+
+def _app(args):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(RUTA_APP, default_timeout=args.timeout)
+    at.secrets["BACKEND"] = "local"
+    at.secrets["INVESTIGADOR_PASSWORD"] = "carga"
+    at.secrets["SUPABASE_URL"] = at.secrets["SUPABASE_KEY"] = "local"
+    return at
+
+def _boton(at, texto):
+    return next(b for b in at.button if texto in b.label)
+
+def _paso(at, mediciones, nombre, accion=None):
+    inicio = time.perf_counter()
+    if accion: accion()
+    at.run()
+    degradado = any(str(w.value).startswith(AVISOS_DEGRADADOS) for w in at.warning) or any(str(c.value).startswith(AVISOS_DEGRADADOS) for c in at.caption)
+    mediciones.append((nombre, (time.perf_counter() - inicio) * 1000, bool(at.exception) or bool(at.error) or degradado))
+
+def sesion_paciente(args, i):
+    mediciones, at = [], _app(args)
+    _paso(at, mediciones, "pantalla_login")
+    at.text_input[0].input(f"P{i:04d}"); at.text_input[1].input(str(1000 + i))
+    _paso(at, mediciones, "login_paciente", lambda: _boton(at, "Ingresar").click())
+    _paso(at, mediciones, "envio_triage", lambda: _boton(at, "Enviar").click())
+    return mediciones
+
+def sesion_investigador(args, i):
+    mediciones, at = [], _app(args)
+    _paso(at, mediciones, "pantalla_login")
+    at.text_input[2].input("carga")
+    _paso(at, mediciones, "login_investigador", lambda: _boton(at, "Desbloquear").click())
+    for n in range(args.navegaciones):
+        opciones = at.selectbox(key="paciente_sel").options
+        _paso(at, mediciones, "navegar_radar", lambda: at.selectbox(key="paciente_sel").set_value(opciones[(i + n + 1) % len(opciones)]))
+    return mediciones
+
+def _percentil(valores, q):
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(q * (len(orden) - 1))))] if orden else 0.0
+
+def calibrar_llamadas(args):
+    # Una sesión de cada rol, sin concurrencia, para atribuir llamadas por acción
+    backend, resultado = backend_local.compartido(), {}
+    for rol, sesion in (("paciente", sesion_paciente), ("investigador", sesion_investigador)):
+        backend.reiniciar_contadores()
+        pasos = [m[0] for m in sesion(args, 1)]
+        resultado[rol] = {"llamadas": {f"{t}.{o}": n for (t, o), n in backend.contadores().items()}, "acciones": len(pasos)}
+    return resultado
+
+def ejecutar(args):
+    # Caché en disco propia de la corrida (los workers spawn heredan el entorno): la cola
+    # y las fotos no se mezclan con las de la app real ni pasan a la corrida siguiente
+    os.environ["DTX_DIR_CACHE"] = dir_cache = tempfile.mkdtemp(prefix="dtx-carga-")
+    try: return _ejecutar(args)
+    finally: shutil.rmtree(dir_cache, ignore_errors=True)
+
+def _ejecutar(args):
+    gestor, direccion = backend_local.servir(latencia=args.latencia, variacion=args.latencia / 2, tasa_fallos=args.fallos, n_pacientes=args.pacientes)
+    backend = backend_local.conectar(direccion)
+    # spawn: un fork heredaría hilos muertos (pool de lecturas de datos.py). El proceso
+    # padre no ejecuta AppTest, que reemplaza sys.modules["__main__"] y rompería spawn.
+    with ProcessPoolExecutor(max_workers=args.procesos, mp_context=multiprocessing.get_context("spawn"), initializer=backend_local.conectar, initargs=(direccion,)) as pool:
+        calibracion = pool.submit(calibrar_llamadas, args).result()
+        backend.reiniciar_contadores()
+        inicio = time.perf_counter()
+        futuros = [pool.submit(sesion_paciente, args, i) for i in range(1, args.pacientes + 1)]
+        futuros += [pool.submit(sesion_investigador, args, i) for i in range(args.investigadores)]
+        mediciones, fallidas = [], 0
+        for f in futuros:
+            try: mediciones += f.result()
+            except Exception: fallidas += 1
+    duracion = time.perf_counter() - inicio
+    por_accion = {}
+    for nombre in sorted({m[0] for m in mediciones}):
+        ms = [m[1] for m in mediciones if m[0] == nombre]
+        por_accion[nombre] = {"n": len(ms), "errores": sum(m[2] for m in mediciones if m[0] == nombre), "p50_ms": _percentil(ms, 0.5), "p95_ms": _percentil(ms, 0.95)}
+    llamadas = Counter({f"{t}.{o}": n for (t, o), n in backend.contadores().items()})
+    gestor.shutdown()
+    envio = calibracion["paciente"]["llamadas"]
+    return {
+        "duracion_s": duracion, "acciones": len(mediciones), "sesiones_fallidas": fallidas, "acciones_por_s": len(mediciones) / duracion if duracion else 0.0,
+        "por_accion": por_accion, "llamadas_backend": dict(llamadas), "llamadas_por_accion": sum(llamadas.values()) / max(1, len(mediciones)),
+        "calibracion": calibracion, "llamadas_envio_triage": envio.get("registros_diarios.upsert", 0) + envio.get("registros_diarios.insert", 0) + envio.get("registros_diarios.update", 0),
+    }
+
+def imprimir(r):
+    print(f"⏱️  {r['acciones']} acciones en {r['duracion_s']:.1f} s → {r['acciones_por_s']:.1f} acciones/s ({r['sesiones_fallidas']} sesiones fallidas)")
+    print(f"{'acción':<22}{'n':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for nombre, m in r["por_accion"].items(): print(f"{nombre:<22}{m['n']:>6}{m['errores']:>6}{m['p50_ms']:>10.0f}{m['p95_ms']:>10.0f}")
+    print(f"🔌 Llamadas al backend por acción: {r['llamadas_por_accion']:.2f} · escrituras por envío de triage: {r['llamadas_envio_triage']}")
+    for rol, c in r["calibracion"].items(): print(f"   {rol}: {c['llamadas']} en {c['acciones']} acciones")
+
+def principal():
+    parser = argparse.ArgumentParser(description="Prueba de carga del pico matutino contra el backend local.")
+    parser.add_argument("--pacientes", type=int, default=200)
+    parser.add_argument("--investigadores", type=int, default=20)
+    parser.add_argument("--navegaciones", type=int, default=3, help="Cambios de paciente por investigador")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 4, help="Workers concurrentes")
+    parser.add_argument("--latencia", type=float, default=0.03, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--fallos", type=float, default=0.0, help="Probabilidad de fallo inyectado por llamada")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    parser.add_argument("--max-p95-ms", type=float, help="Falla si alguna acción supera este p95")
+    parser.add_argument("--max-llamadas-envio", type=int, help="Falla si un envío de triage usa más escrituras")
+    args = parser.parse_args()
+    reporte = ejecutar(args)
+    imprimir(reporte)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(reporte, f, ensure_ascii=False, indent=2)
+    excedidos = [n for n, m in reporte["por_accion"].items() if args.max_p95_ms and m["p95_ms"] > args.max_p95_ms]
+    if args.max_llamadas_envio is not None and reporte["llamadas_envio_triage"] > args.max_llamadas_envio: excedidos.append("llamadas_envio_triage")
+    if excedidos or reporte["sesiones_fallidas"]:
+        print(f"❌ Umbrales excedidos: {excedidos or 'sesiones fallidas'}"); sys.exit(1)
+
+if __name__ == "__main__":
+    # AppTest reemplaza sys.modules["__main__"] en los workers: las funciones que se
+    # les envían deben venir del módulo importado por nombre, no de __main__.
+    import prueba_carga
+    prueba_carga.principal()
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+# =====================================================================
+# 🚦 MOTOR DE REGLAS DEL SEMÁFORO (VERSIONADO)
+# =====================================================================
+# Los umbrales viven en reglas_triage.json. Una versión publicada no se edita:
+# el equipo clínico agrega una nueva y cambia "vigente". Cada registro guarda la
+# versión con la que fue puntuado (columna version_reglas) y el histórico puede
+# repuntuarse en bloque con:  python reglas.py repuntuar [version]
+# numpy/pandas se importan dentro de las rutas vectorizadas: el envío del triage
+# (ruta escalar) no debe cargarlos.
+
+ROJO, AMARILLO, VERDE = "🔴 ROJO", "🟡 AMARILLO", "🟢 VERDE"
+RUTA_REGLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reglas_triage.json")
+COLUMNAS_PUNTAJE = ["eficiencia_sueno", "latencia_min", "fatiga_bfi", "estres_nccn", "dolor_maximo", "estado_animo"]
+
+with open(RUTA_REGLAS, encoding="utf-8") as f: _config = json.load(f)
+VERSION_VIGENTE = _config["vigente"]
+VERSIONES = _config["versiones"]
+
+def umbrales(version=None):
+    return VERSIONES[version or VERSION_VIGENTE]
+
+# --- Ruta escalar (envío del triage) ---
+def calcular_semaforo(eficiencia, latencia, fatiga, estres, dolor_max, estado_animo, version=None):
+    u = umbrales(version)
+    if fatiga >= u["fatiga_rojo"] or dolor_max >= u["dolor_rojo"] or estado_animo in u["animos_rojo"]: return ROJO
+    elif eficiencia < u["eficiencia_min"] or latencia > u["latencia_max"] or fatiga >= u["fatiga_amarillo"] or estres >= u["estres_amarillo"] or estado_animo in u["animos_amarillo"]: return AMARILLO
+    else: return VERDE
+
+# --- Ruta vectorizada (un solo pase sobre un DataFrame de registros_diarios) ---
+def puntuar(df, version=None):
+    import numpy as np
+    import pandas as pd
+    u = umbrales(version)
+    num = {c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64") for c in COLUMNAS_PUNTAJE if c != "estado_animo"}
+    animo = df["estado_animo"]
+    # Las comparaciones con NaN dan False: un dato faltante no dispara alertas, igual que antes
+    with np.errstate(invalid="ignore"):
+        rojo = (num["fatiga_bfi"] >= u["fatiga_rojo"]) | (num["dolor_maximo"] >= u["dolor_rojo"]) | animo.isin(u["animos_rojo"]).to_numpy()
+        amarillo = ((num["eficiencia_sueno"] < u["eficiencia_min"]) | (num["latencia_min"] > u["latencia_max"]) | (num["fatiga_bfi"] >= u["fatiga_amarillo"])
+                    | (num["estres_nccn"] >= u["estres_amarillo"]) | animo.isin(u["animos_amarillo"]).to_numpy())
+    return pd.Series(np.select([rojo, amarillo], [ROJO, AMARILLO], VERDE), index=df.index, name="semaforo")
+
+def verificar_paridad(df, version=None):
+    import numpy as np
+    import pandas as pd
+    # Devuelve las filas en que la ruta vectorizada y la escalar no coinciden (debe ser vacío)
+    vector = puntuar(df, version)
+    escalar = [calcular_semaforo(*(np.nan if pd.isna(v) else v for v in fila), version=version) for fila in df[COLUMNAS_PUNTAJE].itertuples(index=False)]
+    return df[vector.to_numpy() != np.array(escalar, dtype=object)]
+
+# --- Repuntuación masiva del histórico ---
+def repuntuar(cliente, version=None, tam_pagina=1000):
+    import pandas as pd
+    import datos
+    version = version or VERSION_VIGENTE
+    columnas = "id, id_paciente, fecha, semaforo, version_reglas, " + ", ".join(COLUMNAS_PUNTAJE)
+    leidos = cambiados = 0
+    for filas in datos.iterar_keyset(cliente, "registros_diarios", columnas, ("id",), tam_pagina):
+        df = pd.DataFrame(filas)
+        df["semaforo_nuevo"] = puntuar(df, version)
+        cambios = df[(df["semaforo_nuevo"] != df["semaforo"]) | (df["version_reglas"] != version)]
+        if not cambios.empty:
+            lote = [{"id_paciente": r.id_paciente, "fecha": r.fecha, "semaforo": r.semaforo_nuevo, "version_reglas": version} for r in cambios.itertuples(index=False)]
+            datos.guardar_lote_registros(cliente, lote)
+        leidos += len(df); cambiados += len(cambios)
+    return leidos, cambiados
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "repuntuar": sys.exit("Uso: python reglas.py repuntuar [version]")
+    import datos
+    leidos, cambiados = repuntuar(datos.cliente_desde_secretos(), sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"{leidos} registros evaluados, {cambiados} actualizados.")
@@ -0,0 +1,26 @@
+-- =====================================================================
+-- 🔑 UNICIDAD (id_paciente, fecha) EN registros_diarios
+-- Requerida por el upsert del triage matutino (on_conflict=id_paciente,fecha).
+-- Ejecutar en el SQL Editor de Supabase. Es idempotente.
+-- =====================================================================
+
+-- 1) Depurar duplicados previos (se conserva el registro más reciente de cada día)
+DELETE FROM registros_diarios r
+USING registros_diarios d
+WHERE r.id_paciente = d.id_paciente AND r.fecha = d.fecha AND r.id < d.id;
+
+-- 2) Crear la restricción sólo si no existe
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'registros_diarios_paciente_fecha_key'
+          AND conrelid = 'registros_diarios'::regclass
+    ) THEN
+        ALTER TABLE registros_diarios
+            ADD CONSTRAINT registros_diarios_paciente_fecha_key UNIQUE (id_paciente, fecha);
+    END IF;
+END $$;
+
+-- 3) Verificación: debe devolver 0 filas
+SELECT id_paciente, fecha, count(*) FROM registros_diarios GROUP BY 1, 2 HAVING count(*) > 1;
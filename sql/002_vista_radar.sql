@@ -0,0 +1,32 @@
+-- =====================================================================
+-- 📡 VISTA DEL RADAR: UNA FILA POR PACIENTE CON EL ESTADO DE HOY
+-- Proyecta sólo las columnas que usa el panel (sin PIN ni cargas) y resuelve
+-- el JOIN y los valores por defecto en el servidor.
+-- =====================================================================
+
+ALTER TABLE pacientes ADD COLUMN IF NOT EXISTS grupo text DEFAULT 'EXPERIMENTAL';
+ALTER TABLE pacientes ADD COLUMN IF NOT EXISTS fecha_inicio date;
+
+CREATE OR REPLACE VIEW v_radar_hoy AS
+SELECT
+    p.id_paciente,
+    COALESCE(p.grupo, 'EXPERIMENTAL')   AS grupo,
+    p.cohorte,
+    p.fecha_inicio,
+    COALESCE(r.estado_triage, 'Pendiente') AS estado_triage,
+    COALESCE(r.semaforo, '⚪')           AS semaforo,
+    COALESCE(r.estado_animo, 'S/D')     AS estado_animo,
+    COALESCE(r.eficiencia_sueno, 0)     AS eficiencia_sueno,
+    COALESCE(r.fatiga_bfi, 0)           AS fatiga_bfi,
+    COALESCE(r.dolor_maximo, 0)         AS dolor_maximo,
+    r.zonas_dolor,
+    r.calidad_sueno,
+    r.estado_sesion
+FROM pacientes p
+LEFT JOIN registros_diarios r
+    ON r.id_paciente = p.id_paciente
+   AND r.fecha = (now() AT TIME ZONE 'America/Montevideo')::date;
+
+-- El JOIN sólo toma los registros de hoy: con este índice se leen esas filas y no
+-- todo el histórico. La paginación por id_paciente usa la clave de pacientes.
+CREATE INDEX IF NOT EXISTS registros_diarios_fecha_idx ON registros_diarios (fecha);
@@ -0,0 +1,7 @@
+-- =====================================================================
+-- 🚦 VERSIÓN DE REGLAS CON LA QUE SE PUNTUÓ CADA SEMÁFORO
+-- Los registros previos fueron puntuados con los umbrales originales (v1).
+-- =====================================================================
+
+ALTER TABLE registros_diarios ADD COLUMN IF NOT EXISTS version_reglas text;
+UPDATE registros_diarios SET version_reglas = 'v1' WHERE version_reglas IS NULL AND semaforo IS NOT NULL;
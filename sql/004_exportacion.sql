@@ -0,0 +1,36 @@
+-- =====================================================================
+-- 📦 EXPORTACIÓN TIDY DATA (registros_diarios + pacientes)
+-- updated_at permite exportaciones incrementales ("desde la última") y el
+-- índice (fecha, id) sostiene la paginación por clave del volcado completo.
+-- =====================================================================
+
+ALTER TABLE registros_diarios ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+ALTER TABLE pacientes ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION tocar_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS registros_diarios_updated_at ON registros_diarios;
+CREATE TRIGGER registros_diarios_updated_at BEFORE INSERT OR UPDATE ON registros_diarios
+    FOR EACH ROW EXECUTE FUNCTION tocar_updated_at();
+
+DROP TRIGGER IF EXISTS pacientes_updated_at ON pacientes;
+CREATE TRIGGER pacientes_updated_at BEFORE INSERT OR UPDATE ON pacientes
+    FOR EACH ROW EXECUTE FUNCTION tocar_updated_at();
+
+CREATE INDEX IF NOT EXISTS registros_diarios_fecha_id_idx ON registros_diarios (fecha, id);
+CREATE INDEX IF NOT EXISTS registros_diarios_updated_at_idx ON registros_diarios (updated_at);
+
+-- Sin PIN: sólo atributos de aleatorización del participante
+CREATE OR REPLACE VIEW v_registros_export AS
+SELECT
+    r.*,
+    p.cohorte,
+    COALESCE(p.grupo, 'EXPERIMENTAL') AS grupo,
+    p.fecha_inicio,
+    GREATEST(r.updated_at, p.updated_at) AS actualizado
+FROM registros_diarios r
+JOIN pacientes p ON p.id_paciente = r.id_paciente;
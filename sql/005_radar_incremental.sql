@@ -0,0 +1,29 @@
+-- =====================================================================
+-- 🔄 REFRESCO INCREMENTAL DEL RADAR
+-- Agrega a v_radar_hoy la marca de última modificación (paciente o registro de
+-- hoy) para pedir sólo las filas cambiadas desde el último refresco.
+-- Requiere sql/004_exportacion.sql (columnas updated_at).
+-- =====================================================================
+
+CREATE OR REPLACE VIEW v_radar_hoy AS
+SELECT
+    p.id_paciente,
+    COALESCE(p.grupo, 'EXPERIMENTAL')   AS grupo,
+    p.cohorte,
+    p.fecha_inicio,
+    COALESCE(r.estado_triage, 'Pendiente') AS estado_triage,
+    COALESCE(r.semaforo, '⚪')           AS semaforo,
+    COALESCE(r.estado_animo, 'S/D')     AS estado_animo,
+    COALESCE(r.eficiencia_sueno, 0)     AS eficiencia_sueno,
+    COALESCE(r.fatiga_bfi, 0)           AS fatiga_bfi,
+    COALESCE(r.dolor_maximo, 0)         AS dolor_maximo,
+    r.zonas_dolor,
+    r.calidad_sueno,
+    r.estado_sesion,
+    GREATEST(p.updated_at, r.updated_at) AS actualizado
+FROM pacientes p
+LEFT JOIN registros_diarios r
+    ON r.id_paciente = p.id_paciente
+   AND r.fecha = (now() AT TIME ZONE 'America/Montevideo')::date;
+
+CREATE INDEX IF NOT EXISTS pacientes_updated_at_idx ON pacientes (updated_at);
@@ -0,0 +1,39 @@
+-- =====================================================================
+-- 📊 RESUMEN SEMANAL PRECALCULADO (analitica.py)
+-- Una fila por paciente y semana de ensayo. resumen_corridas registra cada
+-- corrida terminada: la siguiente corrida incremental parte de la última marca
+-- (inicio de la corrida menos un margen). marca_fuente es la marca de la corrida
+-- que escribió la fila, sólo para trazabilidad.
+-- =====================================================================
+
+CREATE TABLE IF NOT EXISTS resumen_semanal (
+    id_paciente         text NOT NULL REFERENCES pacientes (id_paciente),
+    semana              integer NOT NULL,
+    cohorte             text,
+    grupo               text,
+    fatiga_media        real,
+    dolor_medio         real,
+    eficiencia_media    real,
+    dias_reportados     integer,
+    sesiones            integer,
+    adherencia_triage   real,
+    adherencia_sesiones real,
+    tonelaje            real,
+    rpe_medio           real,
+    marca_fuente        timestamptz,
+    calculado_el        timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (id_paciente, semana)
+);
+
+CREATE INDEX IF NOT EXISTS resumen_semanal_brazo_idx ON resumen_semanal (cohorte, grupo, semana);
+
+CREATE TABLE IF NOT EXISTS resumen_corridas (
+    id                  bigserial PRIMARY KEY,
+    marca               timestamptz NOT NULL,
+    completa            boolean NOT NULL,
+    pacientes           integer NOT NULL,
+    filas               integer NOT NULL,
+    terminado_el        timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS resumen_corridas_marca_idx ON resumen_corridas (marca DESC);
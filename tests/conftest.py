@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# La caché en disco y las métricas de las pruebas no deben tocar las de la app:
+# cache_disco y metricas leen estas variables al importarse.
+os.environ["DTX_DIR_CACHE"] = tempfile.mkdtemp(prefix="dtx-cache-")
+os.environ["DTX_DIR_METRICAS"] = tempfile.mkdtemp(prefix="dtx-metricas-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend_local
+import cache_disco
+import datos
+
+@pytest.fixture(autouse=True)
+def cache_limpia(monkeypatch, tmp_path):
+    # Cada prueba arranca sin fotos en memoria ni en disco y sin cola pendiente
+    monkeypatch.setattr(cache_disco, "DIR_CACHE", str(tmp_path))
+    monkeypatch.setattr(cache_disco, "RUTA", str(tmp_path / "dtx.sqlite"))
+    monkeypatch.setattr(cache_disco, "_preparada", False)
+    monkeypatch.setattr(cache_disco, "origen", "")
+    datos.cache.limpiar()
+    yield
+    datos.cache.limpiar()
+
+@pytest.fixture
+def backend_con_tope(request, monkeypatch):
+    # Backend sembrado con un tope de filas por respuesta chico, para que pocos datos ya
+    # ocupen varias páginas. El del servidor y el de datos.py son siempre el mismo.
+    # Se ajusta con @pytest.mark.parametrize("backend_con_tope", [{"max_filas": 20, ...}], indirect=True)
+    config = {"max_filas": 200, "n_pacientes": 20, "dias": 30, **getattr(request, "param", {})}
+    monkeypatch.setattr(datos, "MAX_FILAS_SERVIDOR", config["max_filas"])
+    return backend_local.BackendLocal(max_filas=config["max_filas"]).sembrar(n_pacientes=config["n_pacientes"], dias=config["dias"])
@@ -0,0 +1,107 @@
+import datetime
+import time
+
+import pytest
+
+import alertas
+import backend_local
+import datos
+import reglas
+
+HOY = str(datetime.datetime.now(backend_local.ZONA).date())
+
+# 80 pacientes x 14 días superan varias veces el tope de filas del servidor
+cohorte_de_80 = pytest.mark.parametrize("backend_con_tope", [{"n_pacientes": 80, "dias": 20}], indirect=True)
+
+@cohorte_de_80
+def test_ventana_completa_sobre_varias_paginas(backend_con_tope):
+    cohorte = backend_con_tope
+    filas = alertas.leer_ventana(cohorte, HOY)
+    desde = str(datetime.date.fromisoformat(HOY) - datetime.timedelta(days=alertas.VENTANA_DIAS - 1))
+    assert len(filas) == sum(str(r["fecha"]) >= desde for r in cohorte.tablas["registros_diarios"])
+    assert {f["id_paciente"] for f in filas} == {p["id_paciente"] for p in cohorte.tablas["pacientes"]}
+
+@cohorte_de_80
+def test_ventana_recortada_falla_en_vez_de_alertar(backend_con_tope, monkeypatch):
+    cohorte = backend_con_tope
+    # Un recorrido que se corta en la primera página no debe llegar a las reglas
+    original = datos.iterar_keyset
+    monkeypatch.setattr(datos, "iterar_keyset", lambda *a, **k: iter([next(original(*a, **k))]))
+    with pytest.raises(alertas.VentanaIncompleta): alertas.leer_ventana(cohorte, HOY)
+
+# --- Reglas de escanear() sobre cohortes armadas a mano ---
+DIA = datetime.date(2026, 10, 18)
+
+def _fecha(hace): return str(DIA - datetime.timedelta(days=hace))
+
+def _cohorte(ids, dias=alertas.VENTANA_DIAS):
+    # Todos reportan cada día de la ventana en verde, con fatiga estable y sin cargas
+    pacientes = [{"id_paciente": i, "grupo": "EXPERIMENTAL", "fecha_inicio": _fecha(60)} for i in ids]
+    registros = {(i, h): {"id_paciente": i, "fecha": _fecha(h), "semaforo": reglas.VERDE, "fatiga_bfi": 2, **dict.fromkeys(alertas.COLUMNAS_KILOS)}
+                 for i in ids for h in range(dias)}
+    return pacientes, registros
+
+def _feed(pacientes, registros, alerta):
+    feed = alertas.escanear(list(registros.values()), pacientes, str(DIA))
+    return feed[feed["alerta"] == alerta].set_index("id_paciente")
+
+def test_racha_de_semaforos_vigente():
+    pacientes, registros = _cohorte(["ACTUAL", "SALTEADA", "VIEJA", "CORTA"])
+    for h in (0, 1, 2): registros["ACTUAL", h]["semaforo"] = reglas.ROJO if h < 2 else reglas.AMARILLO
+    # Los días sin reporte no cortan la racha
+    for h in (0, 2, 3): registros["SALTEADA", h]["semaforo"] = reglas.AMARILLO
+    del registros["SALTEADA", 1]
+    # Tres amarillos hace 11 a 13 días y nada desde entonces: dato viejo, no alerta
+    for h in (11, 12, 13): registros["VIEJA", h]["semaforo"] = reglas.AMARILLO
+    for h in range(11): del registros["VIEJA", h]
+    for h in (0, 1): registros["CORTA", h]["semaforo"] = reglas.AMARILLO
+    feed = _feed(pacientes, registros, "Racha de semáforos")
+    assert set(feed.index) == {"ACTUAL", "SALTEADA"}
+    assert feed.loc["ACTUAL", "severidad"] == alertas.ALTA and feed.loc["SALTEADA", "severidad"] == alertas.MEDIA
+
+def test_fatiga_en_ascenso():
+    pacientes, registros = _cohorte(["SUBE", "LENTA", "POCOS"])
+    for h in range(7): registros["SUBE", h]["fatiga_bfi"] = 9 - h          # +1 punto por día
+    for h in range(7): registros["LENTA", h]["fatiga_bfi"] = 5 - h // 4     # ~0.2 por día
+    for h in range(7): registros["POCOS", h]["fatiga_bfi"] = 9 - 2 * h if h < 3 else None
+    feed = _feed(pacientes, registros, "Fatiga en ascenso")
+    assert set(feed.index) == {"SUBE"}
+    assert feed.loc["SUBE", "valor"] == pytest.approx(1.0) and feed.loc["SUBE", "severidad"] == alertas.ALTA
+
+def test_dias_sin_triage_hasta_ayer():
+    pacientes, registros = _cohorte(["AUSENTE", "HOY_NO", "NUEVO"])
+    for h in (1, 2, 3): del registros["AUSENTE", h]
+    # El reporte de hoy todavía puede llegar: faltar sólo hoy no cuenta
+    del registros["HOY_NO", 0]
+    # Quien empezó ayer no debía reportar antes
+    pacientes[2]["fecha_inicio"] = _fecha(1)
+    for h in range(1, alertas.VENTANA_DIAS): del registros["NUEVO", h]
+    feed = _feed(pacientes, registros, "Sin triage")
+    assert set(feed.index) == {"AUSENTE"} and feed.loc["AUSENTE", "valor"] == 3
+
+def test_salto_de_carga_semanal():
+    pacientes, registros = _cohorte(["SALTO", "ESTABLE", "SIN_PREVIA"])
+    for h in (2, 4, 9, 11):
+        registros["SALTO", h]["kilos_ejercicio_1"] = 100 if h < 7 else 50
+        registros["ESTABLE", h]["kilos_ejercicio_1"] = 100
+    registros["SIN_PREVIA", 2]["kilos_ejercicio_1"] = 100
+    feed = _feed(pacientes, registros, "Salto de carga")
+    assert set(feed.index) == {"SALTO"}
+    assert feed.loc["SALTO", "valor"] == pytest.approx(1.0) and feed.loc["SALTO", "severidad"] == alertas.ALTA
+
+def test_escaneo_de_miles_de_dias_paciente_en_menos_de_un_segundo():
+    import numpy as np
+    rng = np.random.default_rng(0)
+    ids = [f"P{i:05d}" for i in range(3000)]
+    pacientes, registros = _cohorte(ids)
+    filas = list(registros.values())
+    for f, semaforo, fatiga in zip(filas, rng.choice([reglas.VERDE, reglas.AMARILLO, reglas.ROJO], len(filas), p=[0.7, 0.2, 0.1]), rng.integers(0, 11, len(filas))):
+        f["semaforo"], f["fatiga_bfi"], f["kilos_ejercicio_1"] = semaforo, int(fatiga), float(rng.choice([0, 20, 40]))
+    filas = [f for f in filas if rng.random() < 0.9]   # ~10 % de días sin reporte
+    assert len(filas) > 35_000
+    alertas.escanear(filas, pacientes, str(DIA))       # importa numpy/pandas fuera de la medición
+    alertas._memo.clear()
+    inicio = time.perf_counter()
+    feed = alertas.escanear(list(filas), pacientes, str(DIA))
+    assert time.perf_counter() - inicio < 1.0
+    assert len(feed) and set(feed["alerta"]) >= {"Racha de semáforos", "Fatiga en ascenso", "Sin triage"}
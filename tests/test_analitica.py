@@ -0,0 +1,84 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+import analitica
+import backend_local
+
+PACIENTES = [
+    {"id_paciente": "A", "cohorte": "MAMA", "grupo": "EXPERIMENTAL", "fecha_inicio": "2026-10-01"},  # jueves
+    {"id_paciente": "B", "cohorte": "MAMA", "grupo": "CONTROL", "fecha_inicio": "2026-10-15"},
+    {"id_paciente": "C", "cohorte": "PROSTATA", "grupo": None, "fecha_inicio": None},
+]
+
+def _registros(*filas):
+    return pd.DataFrame([dict(zip(("id_paciente", "fecha", "fatiga_bfi", "estado_sesion"), f)) for f in filas], columns=analitica.COLUMNAS_FUENTE)
+
+def test_grilla_completa_y_semana_en_curso():
+    res = analitica.agregados_semanales(_registros(("A", "2026-10-02", 3, "Completado"), ("A", "2026-10-16", 5, None)), PACIENTES, datetime.date(2026, 10, 18))
+    a = res[res["id_paciente"] == "A"].set_index("semana")
+    # La semana 2 no tiene reportes y aun así cuenta, con adherencia 0
+    assert list(a.index) == [1, 2, 3]
+    assert a.loc[2, "dias_reportados"] == 0 and a.loc[2, "adherencia_triage"] == 0
+    assert a.loc[1, "adherencia_triage"] == 1 / 7 and a.loc[1, "adherencia_sesiones"] == 1 / 3
+    # Semana 3 en curso: 4 días transcurridos (jue a dom) y una sola sesión esperada (vie)
+    assert a.loc[3, "adherencia_triage"] == 1 / 4 and a.loc[3, "adherencia_sesiones"] == 0
+    b = res[res["id_paciente"] == "B"]
+    assert len(b) == 1 and b["adherencia_triage"].iloc[0] == 0 and pd.isna(b["adherencia_sesiones"].iloc[0])
+    assert "C" not in set(res["id_paciente"])
+
+def test_paciente_sin_reportes_suma_semanas_en_corridas_incrementales():
+    b = backend_local.BackendLocal().sembrar(n_pacientes=4, dias=10)
+    hoy = datetime.datetime.now(backend_local.ZONA).date()
+    analitica.actualizar_resumen(b, hoy=hoy)
+    # Una semana después, sin un solo registro nuevo
+    analitica.actualizar_resumen(b, hoy=hoy + datetime.timedelta(days=7))
+    semanas = {(f["id_paciente"], f["semana"]) for f in b.tablas["resumen_semanal"]}
+    assert {s for p, s in semanas if p == "P0001"} == {1, 2, 3}
+
+@pytest.mark.parametrize("backend_con_tope", [{"max_filas": 20, "n_pacientes": 6}], indirect=True)
+def test_fecha_inicio_posterior_borra_semanas_sobrantes_y_resumen_paginado(backend_con_tope, monkeypatch):
+    b = backend_con_tope
+    analitica.actualizar_resumen(b)
+    assert len(analitica.leer_resumen(b)) == len(b.tablas["resumen_semanal"]) == 6 * 5
+    p = next(p for p in b.tablas["pacientes"] if p["id_paciente"] == "P0001")
+    p.update(fecha_inicio=str(datetime.date.fromisoformat(p["fecha_inicio"]) + datetime.timedelta(days=14)), updated_at=backend_local._ahora())
+    analitica.actualizar_resumen(b)
+    assert {f["semana"] for f in b.tablas["resumen_semanal"] if f["id_paciente"] == "P0001"} == {1, 2, 3}
+    # Sin margen y sin cambios nuevos, nadie se recalcula entero
+    monkeypatch.setattr(analitica, "MARGEN_MARCA", datetime.timedelta(0))
+    analitica.actualizar_resumen(b)
+    assert analitica.actualizar_resumen(b)[0] == 0
+
+def _hace(**delta):
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(**delta)).isoformat()
+
+def test_corrida_cortada_no_adelanta_la_marca(monkeypatch):
+    b = backend_local.BackendLocal().sembrar(n_pacientes=6, dias=10)
+    monkeypatch.setattr(analitica, "MARGEN_MARCA", datetime.timedelta(0))
+    analitica.actualizar_resumen(b)
+    # Cambia P0006 y después P0001, que va en un lote anterior
+    registros = {r["id_paciente"]: r for r in b.tablas["registros_diarios"]}
+    registros["P0006"].update(fatiga_bfi=10, updated_at=_hace(seconds=-1))
+    registros["P0001"].update(fatiga_bfi=10, updated_at=_hace(seconds=-2))
+    original, lotes = analitica._guardar_semanas, []
+    def guardar(cliente, res, marca):
+        if lotes: raise ConnectionError("corte a mitad de la corrida")
+        lotes.append(marca); original(cliente, res, marca)
+    monkeypatch.setattr(analitica, "_guardar_semanas", guardar)
+    with pytest.raises(ConnectionError): analitica.actualizar_resumen(b, lote_pacientes=1)
+    monkeypatch.setattr(analitica, "_guardar_semanas", original)
+    assert analitica.actualizar_resumen(b, lote_pacientes=1)[0] == 2
+
+def test_registro_confirmado_con_hora_anterior_a_la_marca():
+    b = backend_local.BackendLocal().sembrar(n_pacientes=4, dias=40)
+    analitica.actualizar_resumen(b)
+    # Una transacción larga confirma después de la corrida con un now() de antes, en una
+    # semana vieja que el repaso de semanas recientes no vuelve a mirar
+    registro = min((r for r in b.tablas["registros_diarios"] if r["id_paciente"] == "P0003"), key=lambda r: str(r["fecha"]))
+    registro.update(fatiga_bfi=10, dolor_maximo=10, updated_at=_hace(minutes=2))
+    semana_1 = lambda: next(f for f in b.tablas["resumen_semanal"] if f["id_paciente"] == "P0003" and f["semana"] == 1)["dolor_medio"]
+    antes = semana_1()
+    analitica.actualizar_resumen(b)
+    assert semana_1() > antes
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ("pandas", "numpy", "pyarrow", "qrcode", "PIL")
+# Segundos por rol; DTX_ESCALA_PRESUPUESTO los multiplica en máquinas lentas
+ESCALA = float(os.environ.get("DTX_ESCALA_PRESUPUESTO", 1))
+PRESUPUESTO = {
+    "paciente": {"importacion": 0.5, "arranque": 4.0, "primera_pantalla": 2.0},
+    "investigador": {"importacion": 0.5, "arranque": 4.0, "primera_pantalla": 10.0},
+}
+
+# Cada rol en un proceso nuevo: sys.modules y las cachés arrancan vacíos como en un
+# contenedor recién levantado
+SESION = r"""
+import json, sys, time
+inicio = time.perf_counter()
+import alertas, analitica, cache_disco, datos, esquema, exportar, metricas, reglas
+importacion = time.perf_counter() - inicio
+from streamlit.testing.v1 import AppTest
+rol = sys.argv[1]
+at = AppTest.from_file("app.py", default_timeout=60)
+at.secrets["BACKEND"] = "local"; at.secrets["INVESTIGADOR_PASSWORD"] = "pi"
+inicio = time.perf_counter(); at.run(); arranque = time.perf_counter() - inicio
+if rol == "paciente": at.text_input[0].input("P0001"); at.text_input[1].input("1001"); texto = "Ingresar"
+else: at.text_input[2].input("pi"); texto = "Desbloquear"
+next(b for b in at.button if texto in b.label).click()
+inicio = time.perf_counter(); at.run(); primera = time.perf_counter() - inicio
+excepciones, enviado = [e.message for e in at.exception], None
+if rol == "paciente":
+    # El recorrido del paciente termina al enviar el triage, no en la pantalla inicial
+    next(b for b in at.button if "Enviar" in b.label).click(); at.run()
+    excepciones += [e.message for e in at.exception]
+    enviado = [s.value for s in at.success]
+print(json.dumps({"importacion": importacion, "arranque": arranque, "primera_pantalla": primera, "excepciones": excepciones, "enviado": enviado,
+                  "modulos": [m for m in %r if m in sys.modules]}))
+""" % (PESADOS,)
+
+def _sesion(rol, tmp_path):
+    entorno = {**os.environ, "DTX_DIR_CACHE": str(tmp_path / "cache"), "DTX_DIR_METRICAS": str(tmp_path / "metricas")}
+    salida = subprocess.run([sys.executable, "-c", SESION, rol], cwd=RAIZ, env=entorno, capture_output=True, text=True, timeout=300)
+    assert salida.returncode == 0, salida.stderr[-2000:]
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+@pytest.mark.parametrize("rol", ["paciente", "investigador"])
+def test_arranque_dentro_del_presupuesto(rol, tmp_path):
+    r = _sesion(rol, tmp_path)
+    assert r["excepciones"] == []
+    for medida, limite in PRESUPUESTO[rol].items():
+        assert r[medida] <= limite * ESCALA, f"{rol}: {medida} {r[medida]:.2f} s > {limite * ESCALA:.2f} s"
+    if rol == "paciente":
+        # El envío del triage no debe pagar la importación de la analítica ni del QR
+        assert any("guardado" in s for s in r["enviado"]), r["enviado"]
+        assert not {"pandas", "qrcode", "PIL"} & set(r["modulos"]), r["modulos"]
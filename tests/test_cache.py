@@ -0,0 +1,36 @@
+import threading
+
+import backend_local
+import cache_disco
+import datos
+
+def test_carga_iniciada_antes_de_una_escritura_no_queda_en_cache():
+    cache, clave = datos.CacheLecturas(), datos._clave("registros_diarios", "*", {"id_paciente": "P0001"})
+    leyendo, seguir = threading.Event(), threading.Event()
+    def cargar_vieja():
+        leyendo.set(); seguir.wait(5)
+        return ["antes de guardar"]
+    hilo = threading.Thread(target=cache.obtener, args=(clave, cargar_vieja))
+    hilo.start()
+    leyendo.wait(5)
+    cache.invalidar("registros_diarios", {"id_paciente": "P0001", "fecha": "2026-01-01"})
+    seguir.set(); hilo.join()
+    assert cache_disco.leer_instantanea(clave) is None
+    assert cache.obtener(clave, lambda: ["después de guardar"]) == ["después de guardar"]
+
+def test_invalidar_no_afecta_cargas_de_otras_claves():
+    cache, clave = datos.CacheLecturas(), datos._clave("registros_diarios", "*", {"id_paciente": "P0002"})
+    cache.obtener(clave, lambda: [1])
+    cache.invalidar("registros_diarios", {"id_paciente": "P0001"})
+    assert cache.obtener(clave, lambda: [2]) == [1]
+
+def test_fotos_y_cola_separadas_por_backend():
+    uno, otro = backend_local.BackendLocal(), backend_local.BackendLocal()
+    datos.usar_backend(uno)
+    cache_disco.guardar_instantanea(("radar",), "radar", (), {"filas": []})
+    cache_disco.encolar("registros_diarios", "upsert", {"id_paciente": "P0001"}, on_conflict="id_paciente,fecha", clave=("registros_diarios", "P0001"))
+    datos.usar_backend(otro)
+    assert cache_disco.leer_instantanea(("radar",)) is None
+    assert cache_disco.pendientes() == [] and cache_disco.tamano_cola() == 0
+    datos.usar_backend(uno)
+    assert cache_disco.leer_instantanea(("radar",)) is not None and cache_disco.tamano_cola() == 1
@@ -0,0 +1,48 @@
+import pytest
+
+import backend_local
+import cache_disco
+import datos
+
+def test_lote_sin_red_falla_y_no_se_encola():
+    b = backend_local.BackendLocal().sembrar(n_pacientes=2, dias=2)
+    b.caido = True
+    with pytest.raises(ConnectionError):
+        datos.guardar_lote_registros(b, [{"id_paciente": "P0001", "fecha": "2026-01-01", "semaforo": "🟢 VERDE"}])
+    assert cache_disco.tamano_cola() == 0
+
+def test_lote_invalida_una_vez_por_tabla(monkeypatch):
+    b = backend_local.BackendLocal().sembrar(n_pacientes=2, dias=2)
+    borrados = []
+    monkeypatch.setattr(cache_disco, "borrar_instantaneas", lambda tabla, afectada: borrados.append(tabla))
+    filas = [{"id_paciente": "P0001", "fecha": f"2026-01-{d:02d}", "semaforo": "🟢 VERDE"} for d in range(1, 31)]
+    datos.guardar_lote_registros(b, filas)
+    assert sorted(borrados) == ["registros_diarios", "v_radar_hoy"]
+
+def _registro(b, fecha):
+    return next(r for r in b.tablas["registros_diarios"] if r["id_paciente"] == "P0001" and str(r["fecha"]) == fecha)
+
+def test_escritura_offline_no_pisa_la_directa_posterior():
+    b = backend_local.BackendLocal().sembrar(n_pacientes=2, dias=2)
+    fila = {"id_paciente": "P0001", "fecha": "2026-01-01", "estado_triage": "Completado"}
+    b.caido = True
+    assert datos.guardar_triage(b, {**fila, "fatiga_bfi": 9, "semaforo": "🔴 ROJO"}) is None
+    assert cache_disco.tamano_cola() == 1
+    b.caido = False
+    datos.guardar_triage(b, {**fila, "fatiga_bfi": 1, "semaforo": "🟢 VERDE"})
+    datos.drenar_cola(b, forzar=True)
+    assert (_registro(b, "2026-01-01")["fatiga_bfi"], _registro(b, "2026-01-01")["semaforo"]) == (1, "🟢 VERDE")
+    assert cache_disco.tamano_cola() == 0
+
+def test_update_directo_solo_supera_sus_columnas():
+    b = backend_local.BackendLocal().sembrar(n_pacientes=2, dias=2)
+    datos.guardar_triage(b, {"id_paciente": "P0001", "fecha": "2026-01-01", "fatiga_bfi": 4})
+    filtros = {"id_paciente": "P0001", "fecha": "2026-01-01"}
+    b.caido = True
+    datos.actualizar(b, "registros_diarios", {"rpe_sesion": 8, "estado_sesion": "Completado"}, filtros)
+    b.caido = False
+    datos.actualizar(b, "registros_diarios", {"rpe_sesion": 5}, filtros)
+    # La sesión encolada sigue pendiente, pero ya sin el RPE viejo
+    assert cache_disco.tamano_cola() == 1
+    datos.drenar_cola(b, forzar=True)
+    assert (_registro(b, "2026-01-01")["rpe_sesion"], _registro(b, "2026-01-01")["estado_sesion"]) == (5, "Completado")
@@ -0,0 +1,44 @@
+import csv
+
+import backend_local
+import datos
+import exportar
+
+def test_exportacion_completa_y_marca(backend_con_tope, tmp_path):
+    b = backend_con_tope
+    total, marca = exportar.exportar(b, tmp_path / "registros.csv", tam_pagina=5000)
+    with open(tmp_path / "registros.csv", encoding="utf-8") as f: escritas = list(csv.DictReader(f))
+    assert total == len(escritas) == len(b.tablas["registros_diarios"])
+    # La marca incremental no puede pasar del inicio de la exportación
+    assert marca <= backend_local._ahora()
+
+def test_incremental_no_pierde_filas_modificadas_durante_la_exportacion(backend_con_tope, monkeypatch, tmp_path):
+    b = backend_con_tope
+    registros = sorted(b.tablas["registros_diarios"], key=lambda r: (str(r["fecha"]), r["id"]))
+    detras, delante = registros[10], registros[-10]
+    original = datos.iterar_keyset
+    def iterar(*a, **k):
+        for i, pagina in enumerate(original(*a, **k)):
+            yield pagina
+            # Tras la primera página cambia una fila ya leída y luego otra todavía por leer
+            if i == 0:
+                detras.update(fatiga_bfi=10, updated_at=backend_local._ahora())
+                delante.update(fatiga_bfi=10, updated_at=backend_local._ahora())
+    monkeypatch.setattr(datos, "iterar_keyset", iterar)
+    _, marca = exportar.exportar(b, tmp_path / "completa.csv")
+    monkeypatch.setattr(datos, "iterar_keyset", original)
+    exportar.exportar(b, tmp_path / "delta.csv", desde=marca)
+    with open(tmp_path / "delta.csv", encoding="utf-8") as f: ids = {int(r["id"]) for r in csv.DictReader(f)}
+    assert {detras["id"], delante["id"]} <= ids
+
+def test_parquet_conserva_precision_y_tipos_de_archivo(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    b = backend_local.BackendLocal().sembrar(n_pacientes=2, dias=3)
+    b.tablas["registros_diarios"][0].update(eficiencia_sueno=87.3, fatiga_bfi=6.5, kilos_ejercicio_1=12.345)
+    exportar.exportar(b, tmp_path / "registros.parquet", formato="parquet")
+    tabla = pq.read_table(tmp_path / "registros.parquet")
+    for col in ("eficiencia_sueno", "fatiga_bfi", "latencia_min", "kilos_ejercicio_1"): assert tabla.schema.field(col).type == pa.float64()
+    assert pa.types.is_dictionary(tabla.schema.field("semaforo").type)
+    fila = tabla.slice(0, 1).to_pylist()[0]
+    assert (fila["eficiencia_sueno"], fila["fatiga_bfi"], fila["kilos_ejercicio_1"]) == (87.3, 6.5, 12.345)
@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import backend_local
+import datos
+
+N = 16
+
+def test_envios_concurrentes_del_mismo_dia_dejan_una_fila():
+    b = backend_local.BackendLocal(latencia=0.01, variacion=0.01)
+    b.sembrar(n_pacientes=1, dias=0)
+    b.reiniciar_contadores()
+    fila = lambda i: {"id_paciente": "P0001", "fecha": "2026-10-18", "estado_triage": "Completado", "fatiga_bfi": i}
+    with ThreadPoolExecutor(max_workers=N) as pool:
+        guardados = list(pool.map(lambda i: datos.guardar_triage(b, fila(i)), range(N)))
+    assert all(g is not None for g in guardados)
+    filas = [r for r in b.tablas["registros_diarios"] if (r["id_paciente"], r["fecha"]) == ("P0001", "2026-10-18")]
+    assert len(filas) == 1 and filas[0]["fatiga_bfi"] in range(N)
+    # Un único viaje de red por envío: el upsert, sin select previo ni insert/update
+    assert b.contadores() == {("registros_diarios", "upsert"): N}
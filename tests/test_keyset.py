@@ -0,0 +1,13 @@
+import datos
+import reglas
+
+def test_paginas_mayores_al_tope_del_servidor_recorren_todo(backend_con_tope):
+    # Con 5000 filas pedidas por página el servidor devuelve su tope: no es la última
+    b = backend_con_tope
+    assert len(b.tablas["registros_diarios"]) > 2 * b.max_filas
+    filas = [f for pagina in datos.iterar_keyset(b, "registros_diarios", "id", ("id",), 5000) for f in pagina]
+    assert [f["id"] for f in filas] == sorted(f["id"] for f in b.tablas["registros_diarios"])
+
+def test_repuntuar_evalua_todo_el_historico(backend_con_tope):
+    leidos, _ = reglas.repuntuar(backend_con_tope)
+    assert leidos == len(backend_con_tope.tablas["registros_diarios"])
@@ -0,0 +1,67 @@
+import time
+
+import backend_local
+import datos
+
+def _backend(latencia, **config):
+    return backend_local.BackendLocal(latencia=latencia, **config).sembrar(n_pacientes=3, dias=2)
+
+def _medir(tareas, timeout=8.0):
+    inicio = time.perf_counter()
+    resultados, errores = datos.leer_en_paralelo(tareas, timeout)
+    return resultados, errores, time.perf_counter() - inicio
+
+def _esperar_colgadas(limite=5.0):
+    fin = time.monotonic() + limite
+    while datos._colgadas and time.monotonic() < fin: time.sleep(0.05)
+    assert not datos._colgadas
+
+def test_la_espera_es_la_de_la_lectura_mas_lenta():
+    lentos = {"radar": _backend(0.2), "historial": _backend(0.3), "paciente": _backend(0.4)}
+    tareas = {
+        "radar": lambda: datos.leer(lentos["radar"], "pacientes", "id_paciente"),
+        "historial": lambda: datos.leer_historial(lentos["historial"], "P0001"),
+        "paciente": lambda: datos.buscar_paciente(lentos["paciente"], "P0002"),
+    }
+    resultados, errores, segundos = _medir(tareas)
+    assert errores == {} and set(resultados) == set(tareas)
+    assert resultados["paciente"]["id_paciente"] == "P0002"
+    # Suma secuencial: 0.9 s; en paralelo, la más lenta más un margen
+    assert 0.4 <= segundos < 0.75
+
+def test_plazo_vencido_y_fallo_parcial():
+    rapido, colgado, caido = _backend(0.05), _backend(2.0), _backend(0.05)
+    caido.caido = True
+    tareas = {
+        "radar": lambda: datos.buscar_paciente(rapido, "P0001"),
+        "historial": lambda: datos.buscar_paciente(colgado, "P0001"),
+        "alertas": lambda: datos.buscar_paciente(caido, "P0001"),
+    }
+    resultados, errores, segundos = _medir(tareas, timeout=0.5)
+    # No se espera a la lectura colgada más allá del plazo, y las que sí llegaron se usan
+    assert segundos < 1.0
+    assert set(resultados) == {"radar"} and resultados["radar"]["id_paciente"] == "P0001"
+    assert isinstance(errores["historial"], TimeoutError)
+    assert isinstance(errores["alertas"], ConnectionError)
+
+def test_dato_en_cache_no_espera_a_lecturas_colgadas(monkeypatch):
+    monkeypatch.setattr(datos, "MAX_COLGADAS", 8)
+    rapido, colgado = _backend(0.0), _backend(0.5)
+    datos.leer_historial(rapido, "P0001")
+    # Ocho lecturas colgadas toman todos los hilos del pool
+    colgadas = {f"colgada_{i}": (lambda i=i: datos.buscar_paciente(colgado, f"P000{i % 3 + 1}")) for i in range(8)}
+    _, errores, _ = _medir(colgadas, timeout=0.1)
+    assert len(errores) == 8
+    resultados, errores, segundos = _medir({"historial": lambda: datos.leer_historial(rapido, "P0001")}, timeout=1.0)
+    assert errores == {} and resultados["historial"] and segundos < 0.05
+    _esperar_colgadas()
+
+def test_con_el_pool_saturado_de_colgadas_falla_rapido():
+    colgado = _backend(0.5)
+    _medir({f"colgada_{i}": (lambda: datos.buscar_paciente(colgado, "P0001")) for i in range(datos.MAX_COLGADAS)}, timeout=0.1)
+    _, errores, segundos = _medir({"paciente": lambda: datos.buscar_paciente(_backend(0.0), "P0002")}, timeout=1.0)
+    assert isinstance(errores["paciente"], TimeoutError) and "saturado" in str(errores["paciente"]) and segundos < 0.05
+    # Al terminar las colgadas vuelven a aceptarse lecturas
+    _esperar_colgadas()
+    resultados, errores, _ = _medir({"paciente": lambda: datos.buscar_paciente(_backend(0.0), "P0002")})
+    assert errores == {} and resultados["paciente"]["id_paciente"] == "P0002"
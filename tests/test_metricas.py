@@ -0,0 +1,40 @@
+import types
+
+import streamlit.runtime.scriptrunner as scriptrunner
+
+import metricas
+
+def test_rerun_cortado_se_cierra_al_empezar_el_siguiente():
+    # st.stop() corta el script antes de fin_rerun(): el próximo rerun del hilo lo cuenta
+    antes = metricas.resumen_reruns()
+    metricas.inicio_rerun("Paciente")
+    metricas.inicio_rerun("Paciente")
+    metricas.fin_rerun()
+    despues = metricas.resumen_reruns()
+    assert despues["reruns_completo"] == antes["reruns_completo"] + 2
+    assert despues["reruns_fragmento"] == antes["reruns_fragmento"]
+
+def test_fragmento_segun_el_contexto_de_streamlit(monkeypatch):
+    @metricas.medir_fragmento("Paciente")
+    def fragmento(): return "ok"
+    contexto = types.SimpleNamespace(fragment_ids_this_run=[])
+    monkeypatch.setattr(scriptrunner, "get_script_run_ctx", lambda suppress_warning=False: contexto)
+    antes = metricas.resumen_reruns()["reruns_fragmento"]
+    # Rerun completo: el costo del fragmento ya está en "completo"
+    assert fragmento() == "ok"
+    assert metricas.resumen_reruns()["reruns_fragmento"] == antes
+    contexto.fragment_ids_this_run = ["cuestionario_triage"]
+    assert fragmento() == "ok"
+    assert metricas.resumen_reruns()["reruns_fragmento"] == antes + 1
+
+def test_cpu_por_reporte_sin_la_del_investigador():
+    antes = metricas.resumen_reruns()
+    metricas.inicio_rerun("Investigador")
+    sum(i * i for i in range(300_000))
+    metricas.fin_rerun()
+    metricas.registrar_reporte()
+    r = metricas.resumen_reruns()
+    assert r["cpu_ms_investigador"] > antes["cpu_ms_investigador"]
+    assert r["cpu_ms_paciente"] == antes["cpu_ms_paciente"]
+    assert r["cpu_ms_por_reporte"] == r["cpu_ms_paciente"] / r["reportes"]
+    assert 'dtx_cpu_ms_total{rol="investigador"}' in metricas.texto_prometheus()
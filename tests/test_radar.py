@@ -0,0 +1,22 @@
+import datetime
+import threading
+import time
+
+import backend_local
+import datos
+
+HOY = str(datetime.datetime.now(backend_local.ZONA).date())
+
+def test_la_foto_se_sirve_mientras_el_delta_espera_la_red():
+    b = backend_local.BackendLocal().sembrar(n_pacientes=30, dias=5)
+    radar = datos.RadarIncremental()
+    assert radar.refrescar(b, HOY) == 30
+    b.latencia = 1.0
+    hilo = threading.Thread(target=radar.refrescar, args=(b, HOY))
+    hilo.start()
+    time.sleep(0.1)
+    inicio = time.perf_counter()
+    filas, total = radar.pagina(0, 10)
+    assert time.perf_counter() - inicio < 0.2
+    assert (len(filas), total) == (10, 30)
+    hilo.join()
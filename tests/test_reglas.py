@@ -0,0 +1,24 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+import esquema
+import reglas
+
+NAN = float("nan")
+# Valores a ambos lados de cada umbral, más el dato faltante
+BORDES = {
+    "eficiencia_sueno": [84.9, 85.0, NAN], "latencia_min": [45, 46, NAN], "fatiga_bfi": [4, 5, 7, 8, NAN],
+    "estres_nccn": [5, 6, NAN], "dolor_maximo": [6, 7, NAN], "estado_animo": [*esquema.ANIMOS, None],
+}
+
+@pytest.fixture(scope="module")
+def grilla():
+    return pd.DataFrame(list(itertools.product(*(BORDES[c] for c in reglas.COLUMNAS_PUNTAJE))), columns=reglas.COLUMNAS_PUNTAJE)
+
+@pytest.mark.parametrize("version", sorted(reglas.VERSIONES))
+def test_paridad_escalar_vectorizada_en_los_bordes(grilla, version):
+    distintas = reglas.verificar_paridad(grilla, version)
+    assert distintas.empty, distintas.head().to_string()
+    assert set(reglas.puntuar(grilla, version)) == {reglas.ROJO, reglas.AMARILLO, reglas.VERDE}